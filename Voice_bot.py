@@ -1,80 +1,73 @@
 import os
 import streamlit as st
 import time
-import speech_recognition as sr
-import pyttsx3
-import threading
-from langchain_groq import ChatGroq
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import uuid
+from llm_router import get_chat_model
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain_core.prompts import ChatPromptTemplate
 from langchain.chains import create_retrieval_chain
-from langchain_community.vectorstores import FAISS
+from web_cache import create_web_vectorstore
 from langchain_community.document_loaders import PyPDFDirectoryLoader
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain.document_loaders import WebBaseLoader
+from vector_registry import get_vectorstore, invalidate
+from rag_streaming import StreamedAnswer
+from context_packing import PackedRetriever
+from semantic_cache import get_semantic_cache
+from instrumentation import export_metrics, serve_metrics
+from voice_service import SentenceBuffer, get_voice_service
 from dotenv import load_dotenv
 import time
 import os
 load_dotenv()  
-# Initialize session state for speech
-if "speaking" not in st.session_state:
-    st.session_state.speaking = False  # Track speech state
-if "engine" not in st.session_state:
-    st.session_state.engine = pyttsx3.init()  # Initialize text-to-speech engine
 
-# Function to speak the response
+# Expose per-stage latency histograms on http://127.0.0.1:$METRICS_PORT/ when METRICS_PORT is set
+serve_metrics()
+# One voice worker per server process owns the TTS engine and microphone; sessions are told apart by ID
+voice = get_voice_service()
+if "voice_session" not in st.session_state:
+    st.session_state.voice_session = uuid.uuid4().hex
+voice_session = st.session_state.voice_session
+
+# Function to speak a complete response
 def speak(text):
-    """Convert text to speech and read it aloud."""
-    if not st.session_state.speaking:
-        st.session_state.speaking = True
-        def run():
-            st.session_state.engine.say(text)
-            st.session_state.engine.runAndWait()
-            st.session_state.speaking = False
-        threading.Thread(target=run, daemon=True).start()  # Run speech in a separate thread
+    """Queue text to be read aloud sentence by sentence."""
+    voice.speak_text(voice_session, text)
 
 # Function to stop voice output
 def stop_speech():
-    """Stop voice output immediately."""
-    if st.session_state.speaking:
-        st.session_state.engine.stop()  # Stop the speech engine
-        st.session_state.speaking = False
+    """Stop voice output immediately, along with any answer still being generated."""
+    voice.cancel(voice_session)
 
 # Function to listen for voice input
 def listen():
-    """Listen for voice input and return recognized text."""
-    recognizer = sr.Recognizer()
-    with sr.Microphone() as source:
-        st.write("Listening...")
-        audio = recognizer.listen(source)  # Capture audio from the microphone
-    try:
-        text = recognizer.recognize_google(audio).lower()  # Recognize speech using Google API
-        return text
-    except sr.UnknownValueError:
-        return "Sorry, I couldn't understand that."  # Handle unrecognized speech
-    except sr.RequestError:
-        return "Sorry, my speech service is down."  # Handle API request errors
+    """Start capturing voice input in the background; the transcript is picked up on a later rerun."""
+    st.session_state.pending_voice_input = voice.listen(voice_session)
 
 # Load Azure API Key
 groq_api_key = os.getenv('GROQ_API_KEY')
 
-# Initialize session state for document processing
-if "vector" not in st.session_state:
-    st.session_state.embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")  # Initialize embeddings
-    st.session_state.loader = WebBaseLoader("https://titlecapture.com/blog/ai-in-title-insurance/")  # Load documents from web
-    try:
-        st.session_state.docs = st.session_state.loader.load()  # Load documents
-        st.session_state.text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)  # Split documents into chunks
-        st.session_state.final_documents = st.session_state.text_splitter.split_documents(st.session_state.docs[:10])  # Split first 10 documents
-        st.session_state.vectors = FAISS.from_documents(st.session_state.final_documents, st.session_state.embeddings)  # Create vector store
-    except Exception as e:
-        st.error(f"Error loading documents: {str(e)}")  # Handle document loading errors
+WEB_CORPUS = "title_insurance_web"
+
+# Build the vector store for the web corpus; runs once per server process, not per session
+def build_web_vectorstore():
+    urls = ["https://titlecapture.com/blog/ai-in-title-insurance/"]  # Load documents from web
+    # Conditional GET against ./web_cache; unchanged pages are not split or embedded again
+    return create_web_vectorstore(WEB_CORPUS, urls, chunk_size=1000, chunk_overlap=200)
+
+# Explicitly rebuild the shared index, e.g. after the source page changed
+if st.sidebar.button("Reload index"):
+    invalidate(WEB_CORPUS)
+
+# One read-only vector store shared by all sessions in this server process
+try:
+    vectors = get_vectorstore(WEB_CORPUS, build_web_vectorstore)
+except Exception as e:
+    st.error(f"Error loading documents: {str(e)}")  # Handle document loading errors
+    st.stop()
 
 st.title("RAG using Open Source LLM Models and Azure OpenAI API with Voice")  # Set the title of the Streamlit app
 
-# Initialize Chat model
-llm = ChatGroq(groq_api_key=groq_api_key, model_name="Llama3-8b-8192")
+# Initialize Chat model; routed across the configured LLM backends with fallback
+llm = get_chat_model("Llama3-8b-8192")
 
 # Define prompt template
 prompt_template = ChatPromptTemplate.from_template(
@@ -90,8 +83,9 @@ prompt_template = ChatPromptTemplate.from_template(
 
 # Create document chain and retrieval chain
 document_chain = create_stuff_documents_chain(llm, prompt_template)
-retriever = st.session_state.vectors.as_retriever()
+retriever = PackedRetriever(vectorstore=vectors)  # Merges overlapping chunks, fits the context to a token budget
 retrieval_chain = create_retrieval_chain(retriever, document_chain)
+answer_cache = get_semantic_cache(WEB_CORPUS)  # Cleared whenever the shared index is reloaded
 
 # UI Layout
 col1, col2 = st.columns([1, 1])
@@ -99,31 +93,66 @@ with col1:
     user_prompt = st.text_input("Input your prompt here")  # Text input for user prompt
 with col2:
     if st.button("Use Voice Input"):
-        st.write("Listening for voice input...")
-        user_prompt = listen()  # Use voice input if button is pressed
+        listen()  # Capture runs on the voice worker; this script run carries on
+    # Stop voice button; shown above the answer so it can interrupt generation and listening as well as speech
+    if st.button("Stop Voice Output"):
+        stop_speech()  # Stop voice output if button is pressed
+        user_prompt = None
+    pending = st.session_state.get("pending_voice_input")
+    if pending is not None:
+        if pending.done():
+            del st.session_state.pending_voice_input
+            user_prompt = None if pending.cancelled() else pending.result()  # Use voice input once recognized
+        else:
+            st.write("Listening for voice input...")
+            time.sleep(0.25)
+            st.rerun()  # Poll again without holding the script on the microphone
 
 if user_prompt:
     try:
-        start = time.process_time()
-        response = retrieval_chain.invoke({"input": user_prompt})  # Get response from retrieval chain
-        response_text = response.get('answer', "No valid response found.")
-        print("Response time:", time.process_time() - start)
-        
-        # Display response
+        # Display response; the answer slot sits above the retrieved chunks
         st.write("### Response:")
-        st.write(response_text)
-        
-        # Speak response
-        speak(response_text)
-        
-        # Show similarity search results
-        with st.expander("Document Similarity Search"):
-            for doc in response.get("context", []):
-                st.write(doc.page_content)
-                st.write("--------------------------------")
+        answer_container = st.container()
+        context_container = st.container()
+
+        # Show similarity search results as soon as retrieval finishes
+        def show_context(docs):
+            with context_container.expander("Document Similarity Search"):
+                for doc in docs:
+                    st.write(doc.page_content)
+                    st.write("--------------------------------")
+
+        cached = answer_cache.get(user_prompt)  # Reuse the answer to a similar earlier question
+        if cached:
+            response_text = cached["answer"]
+            with answer_container:
+                st.write(response_text)
+            show_context(cached["context"])
+            print("Semantic cache hit, similarity:", cached["similarity"])
+            speak(response_text)  # Speak response
+        else:
+            # Speak each sentence as soon as it is generated instead of waiting for the whole answer
+            cancel_event = voice.start_turn(voice_session)
+            streamed = StreamedAnswer(retrieval_chain, {"input": user_prompt}, on_context=show_context,
+                                      cancel_event=cancel_event)
+            sentences = SentenceBuffer()
+
+            def spoken_tokens():
+                for token in streamed.tokens():
+                    for sentence in sentences.feed(token):
+                        voice.speak(voice_session, sentence)
+                    yield token
+                rest = sentences.flush()
+                if rest and not streamed.cancelled:
+                    voice.speak(voice_session, rest)
+
+            with answer_container:
+                st.write_stream(spoken_tokens())  # Render answer tokens as they arrive
+            response_text = streamed.answer or "No valid response found."
+            if streamed.answer and not streamed.cancelled:
+                answer_cache.put(user_prompt, streamed.answer, streamed.context)
+            print("Time to first token:", streamed.time_to_first_token)
+            print("Response time:", streamed.total_latency)
+            export_metrics()  # Per-stage p50/p95/p99 latencies (incl. time_to_first_audio) in ./metrics/latency.json
     except RuntimeError as e:
         st.error(f"An error occurred: {str(e)}")  # Handle runtime errors
-
-# Stop voice button
-if st.button("Stop Voice Output"):
-    stop_speech()  # Stop voice output if button is pressed
@@ -1,20 +1,24 @@
 import streamlit as st 
 import os 
-from langchain_groq import ChatGroq 
-from langchain_community.document_loaders import WebBaseLoader 
+from llm_router import get_chat_model
 from langchain.embeddings import AzureOpenAIEmbeddings,OpenAIEmbeddings,OllamaEmbeddings 
-from langchain.text_splitter import RecursiveCharacterTextSplitter 
 from langchain.chains.combine_documents import create_stuff_documents_chain 
 from langchain_community.chat_models import AzureChatOpenAI 
 from langchain_core.prompts import ChatPromptTemplate 
 from langchain.chains import create_retrieval_chain 
-from langchain_community.vectorstores import FAISS
-from langchain_google_genai import GoogleGenerativeAIEmbeddings  
+from web_cache import create_web_vectorstore
+from vector_registry import get_vectorstore, invalidate
+from rag_streaming import StreamedAnswer
+from context_packing import PackedRetriever
+from semantic_cache import get_semantic_cache
+from instrumentation import export_metrics, serve_metrics
 
-import time 
  
 from dotenv import load_dotenv 
 load_dotenv()  
+
+# Expose per-stage latency histograms on http://127.0.0.1:$METRICS_PORT/ when METRICS_PORT is set
+serve_metrics()
  
 ## Load the Azure OpenAI API key from environment variables 
 # azure_openai_api_key = os.environ['AZURE_OPENAI_API_KEY'] 
@@ -26,28 +30,47 @@ load_dotenv()
 groq_api_key = os.getenv('GROQ_API_KEY')
  
  
-# Check if 'vector' is not in the session state 
-if "vector" not in st.session_state: 
-    # Initialize embeddings using OpenAIEmbeddings 
-    st.session_state.embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-     
-    # Load documents from the specified URL with SSL verification disabled 
-    # st.session_state.loader = WebBaseLoader("https://docs.smith.langchain.com/",verify_ssl=True) 
-    st.session_state.loader = WebBaseLoader("https://titlecapture.com/blog/ai-in-title-insurance/") 
-    st.session_state.docs = st.session_state.loader.load() 
- 
-    # Split the loaded documents into chunks 
-    st.session_state.text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200) 
-    st.session_state.final_documents = st.session_state.text_splitter.split_documents(st.session_state.docs[:10]) 
-     
-    # Create vectors from the document chunks using FAISS 
-    # st.session_state.vectors = FAISS.from_documents(st.session_state.final_documents, st.session_state.embeddings) 
-    st.session_state.vectors = FAISS.from_documents(st.session_state.final_documents, st.session_state.embeddings) 
- 
+WEB_CORPUS = "title_insurance_web"
+
+# File with one URL per line, or comma-separated URLs; sitemaps are expanded. Unset to index the default page
+WEB_SOURCES = os.getenv("WEB_SOURCES", "")
+if WEB_SOURCES:
+    from crawler import crawl_index_name
+
+    # The crawled corpus gets its own index so the single-URL apps don't prune its pages
+    WEB_CORPUS = crawl_index_name(WEB_SOURCES)
+
+
+# Build the vector store for the web corpus; runs once per server process, not per session
+def build_web_vectorstore():
+    if WEB_SOURCES:
+        # Fetch the pages concurrently (bounded per host, robots.txt respected) and embed each one as it
+        # arrives; per-URL timings and failures are written to ./metrics/crawl_report.jsonl
+        from crawler import crawl_web_vectorstore, read_sources
+
+        return crawl_web_vectorstore(WEB_CORPUS, read_sources(WEB_SOURCES), chunk_size=1000, chunk_overlap=200)
+
+    # Load documents from the specified URL
+    # urls = ["https://docs.smith.langchain.com/"]
+    urls = ["https://titlecapture.com/blog/ai-in-title-insurance/"]
+
+    # Pages are revalidated with conditional GETs against ./web_cache; only pages whose text
+    # changed are split and embedded again (chunk_size=1000, chunk_overlap=200), the rest of the
+    # persisted index is reused. flat, hnsw, ivf_flat or ivf_pq via VECTOR_INDEX_TYPE
+    return create_web_vectorstore(WEB_CORPUS, urls, chunk_size=1000, chunk_overlap=200)
+
+
+# Explicitly rebuild the shared index, e.g. after the source page changed
+if st.sidebar.button("Reload index"):
+    invalidate(WEB_CORPUS)
+
+# One read-only vector store shared by all sessions in this server process
+vectors = get_vectorstore(WEB_CORPUS, build_web_vectorstore)
+
 st.title("RAG using Open Source LLM Models And Azure OpenAI API") 
  
-# Initialize the Chat model with the Azure OpenAI API key and model name 
-llm = ChatGroq(groq_api_key=groq_api_key, model_name="Llama3-8b-8192") 
+# Initialize the Chat model; requests go to the fastest healthy backend in LLM_ROUTER_MODELS 
+llm = get_chat_model("Llama3-8b-8192") 
  
 # Define the prompt template for the chat model 
 prompt = ChatPromptTemplate.from_template( 
@@ -64,32 +87,48 @@ Questions:{input}
 # Create a document chain using the LLM and prompt template 
 document_chain = create_stuff_documents_chain(llm,prompt) 
  
-# Create a retriever from the vectors 
-retriever = st.session_state.vectors.as_retriever() 
+# Create a retriever from the vectors; overlapping chunks are merged and the context fits a token budget
+retriever = PackedRetriever(vectorstore=vectors)
  
 # Create a retrieval chain using the retriever and document chain 
 retrieval_chain = create_retrieval_chain(retriever, document_chain) 
  
+# Semantic answer cache for this corpus, cleared whenever the shared index is reloaded
+answer_cache = get_semantic_cache(WEB_CORPUS)
+
 # Input field for the user to enter their prompt 
 prompt = st.text_input("Input your prompt here")  
  
-# If a prompt is entered, process it 
-if prompt: 
-    start = time.process_time() 
-     
-    # Invoke the retrieval chain with the user's prompt 
-    response = retrieval_chain.invoke({"input": prompt}) 
-     
-    # Print the response time 
-    print("Response time:", time.process_time() - start) 
-     
-    # Display the response in the Streamlit app 
-    st.write(response['answer']) 
-        # With a Streamlit expander, show the document similarity search results 
-    with st.expander("Document Similarity Search"): 
-        # Find and display the relevant chunks 
-        for i, doc in enumerate(response["context"]): 
-            st.write(doc.page_content) 
-            st.write("--------------------------------") 
+# If a prompt is entered, process it
+if prompt:
+    # Reserve the answer slot above the retrieved chunks so both render in place as they arrive
+    answer_container = st.container()
+    context_container = st.container()
+
+    # With a Streamlit expander, show the document similarity search results as soon as retrieval finishes
+    def show_context(docs):
+        with context_container.expander("Document Similarity Search"):
+            # Find and display the relevant chunks
+            for doc in docs:
+                st.write(doc.page_content)
+                st.write("--------------------------------")
 
+    # Reuse the answer to a sufficiently similar earlier question without calling the LLM
+    cached = answer_cache.get(prompt)
+    if cached:
+        with answer_container:
+            st.write(cached["answer"])
+        show_context(cached["context"])
+        print("Semantic cache hit, similarity:", cached["similarity"])
+    else:
+        # Stream the retrieval chain's answer tokens into the Streamlit app
+        streamed = StreamedAnswer(retrieval_chain, {"input": prompt}, on_context=show_context)
+        with answer_container:
+            st.write_stream(streamed.tokens())
+        if streamed.answer:
+            answer_cache.put(prompt, streamed.answer, streamed.context)
 
+        # Print the time to first token and the total response time
+        print("Time to first token:", streamed.time_to_first_token)
+        print("Response time:", streamed.total_latency)
+        export_metrics()  # Per-stage p50/p95/p99 latencies in ./metrics/latency.json
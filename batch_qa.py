@@ -0,0 +1,126 @@
+import argparse
+import asyncio
+import csv
+import importlib
+import json
+import os
+import time
+
+from langchain_core.messages import AIMessage, ToolMessage
+
+from instrumentation import LatencyCallbackHandler, export_metrics
+
+# Agent modules exposing get_graph(), which builds the compiled graph on first use
+AGENTS = {"census": "AgentsView", "research": "sample"}
+
+
+def read_questions(path):
+    """
+    Read questions from a JSONL file ({"id": ..., "question": ...} per line)
+    or a CSV file with a `question` column and an optional `id` column.
+    Questions without an ID are numbered by their position in the file.
+    """
+    questions = []
+    if path.endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+    else:
+        with open(path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    for i, row in enumerate(rows):
+        questions.append({"id": str(row.get("id") or i), "question": row["question"]})
+    return questions
+
+
+def compact_output(path):
+    """
+    Prepare an existing output file for resuming and return the IDs already answered.
+
+    The file is rewritten with only the last successful record per ID. Error
+    records are dropped because those questions are retried and appended again,
+    so the output never holds two records for one ID. A partially written last
+    line from an interrupted run is dropped too.
+    """
+    if not os.path.exists(path):
+        return set()
+    records = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Partially written last line of an interrupted run
+            if not record.get("error"):
+                records[record["id"]] = record
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for record in records.values():
+            f.write(json.dumps(record) + "\n")
+    os.replace(tmp_path, path)
+    return set(records)
+
+
+async def answer_question(graph, item):
+    start = time.perf_counter()
+    record = {"id": item["id"], "question": item["question"]}
+    try:
+        state = await graph.ainvoke(
+            {"messages": [("user", item["question"])]},
+            config={"callbacks": [LatencyCallbackHandler()]},
+        )
+        messages = state["messages"]
+        final = messages[-1] if messages else None
+        answered = isinstance(final, AIMessage) and not final.tool_calls and final.content
+        record["answer"] = final.content if answered else ""
+        record["retrieved_chunks"] = [m.content for m in messages if isinstance(m, ToolMessage)]
+        record["tool_calls"] = sum(len(m.tool_calls) for m in messages if isinstance(m, AIMessage))
+        if not answered:
+            # The chatbot node swallows LLM errors (e.g. rate limits) and returns no message;
+            # recording an error makes the question be retried on resume
+            record["error"] = "no answer produced"
+    except Exception as e:
+        record["error"] = str(e)
+    record["timings"] = {"total_seconds": time.perf_counter() - start}
+    return record
+
+
+async def run_batch(graph, questions, output_path, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    write_lock = asyncio.Lock()
+
+    with open(output_path, "a", encoding="utf-8") as out:
+        async def run_one(item):
+            async with semaphore:
+                record = await answer_question(graph, item)
+            async with write_lock:
+                # One flushed line per answer: a crash loses at most the questions in flight
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+            status = "error" if "error" in record else "ok"
+            print(f"[{status}] {item['id']} in {record['timings']['total_seconds']:.2f}s")
+
+        await asyncio.gather(*(run_one(item) for item in questions))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer a file of questions with one of the LangGraph agents.")
+    parser.add_argument("questions", help="JSONL or CSV file of questions")
+    parser.add_argument("output", help="JSONL file for answers; existing answers are skipped on resume")
+    parser.add_argument("--agent", choices=sorted(AGENTS), default="census")
+    parser.add_argument("--concurrency", type=int, default=4, help="Questions answered at the same time")
+    args = parser.parse_args()
+
+    questions = read_questions(args.questions)
+    done = compact_output(args.output)
+    pending = [q for q in questions if q["id"] not in done]
+    print(f"{len(questions)} questions, {len(done)} already answered, {len(pending)} to run")
+
+    # Build the agent (and its vector store) once for the whole batch
+    graph = importlib.import_module(AGENTS[args.agent]).get_graph()
+
+    start = time.perf_counter()
+    asyncio.run(run_batch(graph, pending, args.output, args.concurrency))
+    elapsed = time.perf_counter() - start
+    print(f"Answered {len(pending)} questions in {elapsed:.1f}s "
+          f"({len(pending) / elapsed if elapsed else 0:.2f} questions/s)")
+    export_metrics()
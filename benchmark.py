@@ -0,0 +1,151 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+
+from langchain.chains import create_retrieval_chain
+from langchain.chains.combine_documents import create_stuff_documents_chain
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.prompts import ChatPromptTemplate
+
+from census_store import CENSUS_DIR, CHUNK_OVERLAP, CHUNK_SIZE, load_census_pdfs
+from context_packing import PackedRetriever, count_tokens
+from dedup import ChunkDeduplicator
+from embedding_cache import HashEmbeddings
+from index_factory import INDEX_TYPES, build_vectorstore, index_memory_bytes
+from instrumentation import percentile
+
+# Fixed question set with the (file, page) pairs that answer each question
+QUESTIONS_PATH = "./benchmarks/census_questions.json"
+
+# Each run appends one JSON line here so results can be compared over time
+RESULTS_PATH = "./benchmarks/results.jsonl"
+
+
+def load_questions(path=QUESTIONS_PATH):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def retrieved_pages(docs):
+    """(file, page) pairs of retrieved chunks, including pages merged in by deduplication."""
+    pages = set()
+    for doc in docs:
+        for page in doc.metadata.get("pages") or [doc.metadata]:
+            pages.add((os.path.basename(page["source"]), page["page"]))
+    return pages
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def run_benchmark(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, k=4, index_type="flat",
+                  dedup=False, pack=False, repeats=5, workers=None):
+    """
+    Ingest the bundled census PDFs and answer the fixed question set offline.
+
+    Embeddings come from the deterministic HashEmbeddings model and answers
+    from a fake chat model, so timings reflect this code rather than network
+    calls and runs are comparable across machines and commits.
+    """
+    embeddings = HashEmbeddings()
+    questions = load_questions()
+
+    start = time.perf_counter()
+    pages = load_census_pdfs(CENSUS_DIR, workers=workers)
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True)
+    chunks = splitter.split_documents(pages)
+    deduplicator = None
+    if dedup:
+        deduplicator = ChunkDeduplicator()
+        chunks = list(deduplicator.filter(chunks))
+    split_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectorstore = build_vectorstore(chunks, embeddings, index_type=index_type)
+    if deduplicator:
+        deduplicator.merge_metadata(vectorstore)
+    build_seconds = time.perf_counter() - start
+
+    # Query latency and page-level recall@k over the labelled questions
+    latencies, recalls, hits = [], [], 0
+    for item in questions:
+        relevant = {(file, page) for file, page in item["relevant"]}
+        for _ in range(repeats):
+            start = time.perf_counter()
+            docs = vectorstore.similarity_search(item["question"], k=k)
+            latencies.append(time.perf_counter() - start)
+        found = retrieved_pages(docs) & relevant
+        recalls.append(len(found) / len(relevant))
+        hits += bool(found)
+    latencies.sort()
+
+    # End-to-end RAG overhead with a fake LLM standing in for Groq
+    llm = FakeListChatModel(responses=["benchmark answer"])
+    prompt = ChatPromptTemplate.from_template("<context>\n{context}\n<context>\nQuestions:{input}")
+    if pack:
+        retriever = PackedRetriever(vectorstore=vectorstore, fetch_k=k)
+    else:
+        retriever = vectorstore.as_retriever(search_kwargs={"k": k})
+    chain = create_retrieval_chain(retriever, create_stuff_documents_chain(llm, prompt))
+    rag_latencies, context_tokens = [], []
+    for item in questions:
+        start = time.perf_counter()
+        response = chain.invoke({"input": item["question"]})
+        rag_latencies.append(time.perf_counter() - start)
+        context_tokens.append(sum(count_tokens(doc.page_content) for doc in response["context"]))
+    rag_latencies.sort()
+
+    result = {
+        "timestamp": time.time(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "params": {"chunk_size": chunk_size, "chunk_overlap": chunk_overlap, "k": k,
+                   "index_type": index_type, "dedup": dedup, "pack": pack, "embedder": "HashEmbeddings"},
+        "pages": len(pages),
+        "chunks": len(chunks),
+        "load_seconds": load_seconds,
+        "pages_per_second": len(pages) / load_seconds if load_seconds else None,
+        "chunks_per_second": len(chunks) / (split_seconds + build_seconds),
+        "index_build_seconds": build_seconds,
+        "index_memory_bytes": index_memory_bytes(vectorstore),
+        "query_p50_ms": percentile(latencies, 50) * 1000,
+        "query_p99_ms": percentile(latencies, 99) * 1000,
+        "rag_p50_ms": percentile(rag_latencies, 50) * 1000,
+        "rag_p99_ms": percentile(rag_latencies, 99) * 1000,
+        "context_tokens_mean": sum(context_tokens) / len(context_tokens),
+        f"recall_at_{k}": sum(recalls) / len(recalls),
+        f"hit_rate_at_{k}": hits / len(questions),
+    }
+    if deduplicator:
+        result["dedup"] = deduplicator.report(dim=vectorstore.index.d)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline retrieval and RAG benchmark over the bundled census PDFs.")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat")
+    parser.add_argument("--dedup", action="store_true", help="Deduplicate chunks before indexing")
+    parser.add_argument("--pack", action="store_true", help="Merge overlapping chunks into a token-bounded context")
+    parser.add_argument("--workers", type=int, default=None, help="PDF extraction processes")
+    parser.add_argument("--output", default=RESULTS_PATH)
+    args = parser.parse_args()
+
+    result = run_benchmark(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap, k=args.k,
+                           index_type=args.index_type, dedup=args.dedup, pack=args.pack, workers=args.workers)
+    with open(args.output, "a", encoding="utf-8") as f:
+        f.write(json.dumps(result) + "\n")
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,251 @@
+import hashlib
+import json
+import os
+import shutil
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from langchain_core.documents import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.vectorstores import FAISS
+
+from embedding_cache import EMBEDDING_MODEL, get_embeddings
+from index_factory import HNSW_EF_SEARCH, IVF_NPROBE, VECTOR_INDEX_TYPE, supports_removal, tune_index
+from dedup import ChunkDeduplicator
+from ingest import ingest_documents
+
+# Directory containing census PDFs
+CENSUS_DIR = "./us_census"
+
+# Directory where built FAISS indexes are persisted, one sub-directory per cache key
+INDEX_CACHE_DIR = "./faiss_cache"
+
+# Splitter and embedding settings that the cached index depends on
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 100
+
+# Per-file fingerprints and chunk IDs stored next to each persisted index
+MANIFEST_FILE = "manifest.json"
+
+# Large PDFs are extracted in page ranges of this size so one file can use several cores
+PAGES_PER_TASK = 16
+
+
+def _extract_pages(pdf_path, start, stop):
+    """
+    Extract pages [start, stop) of one PDF as Documents.
+
+    Runs in a worker process. The metadata matches what PyMuPDFLoader attaches
+    to each page, so the parallel and serial paths produce the same documents.
+    """
+    import fitz  # PyMuPDF
+
+    documents = []
+    with fitz.open(pdf_path) as pdf:
+        file_metadata = {k: v for k, v in pdf.metadata.items() if isinstance(v, (str, int))}
+        for number in range(start, min(stop, pdf.page_count)):
+            page = pdf[number]
+            metadata = {"source": pdf_path, "file_path": pdf_path, "page": number, "total_pages": pdf.page_count}
+            metadata.update(file_metadata)
+            documents.append(Document(page_content=page.get_text(), metadata=metadata))
+    return documents
+
+
+def _page_count(pdf_path):
+    import fitz  # PyMuPDF
+
+    with fitz.open(pdf_path) as pdf:
+        return pdf.page_count
+
+
+def iter_pdf_pages(paths, workers=None, pages_per_task=PAGES_PER_TASK):
+    """
+    Yield every page of the given PDFs, fanning the work out to a process pool.
+
+    Each file is one task, except large files which are cut into page ranges of
+    `pages_per_task` pages. Pages come back in (file order, page order)
+    regardless of which worker finishes first, and at most two tasks per worker
+    are in flight, so memory stays bounded however many PDFs there are.
+    `workers=1` extracts in-process. On platforms that spawn worker processes,
+    call this from code guarded by `if __name__ == "__main__":`.
+    """
+    def tasks():
+        for pdf_path in paths:
+            for start in range(0, _page_count(pdf_path), pages_per_task):
+                yield pdf_path, start, start + pages_per_task
+
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        for task in tasks():
+            yield from _extract_pages(*task)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for task in tasks():
+            pending.append(pool.submit(_extract_pages, *task))
+            # Consume results in submission order, which keeps the output deterministic
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def load_pdf_files(paths, workers=None, pages_per_task=PAGES_PER_TASK):
+    """Extract every page of the given PDFs into a list; see iter_pdf_pages."""
+    return list(iter_pdf_pages(paths, workers=workers, pages_per_task=pages_per_task))
+
+
+def iter_census_pdfs(directory, workers=None):
+    """Lazily yield the pages of every PDF in the directory, in file and page order."""
+    paths = [os.path.join(directory, file) for file in sorted(os.listdir(directory)) if file.endswith(".pdf")]
+    return iter_pdf_pages(paths, workers=workers)
+
+
+# Load PDFs and extract text
+def load_census_pdfs(directory, workers=None):
+    return list(iter_census_pdfs(directory, workers=workers))
+
+
+def file_fingerprint(path, block_size=1 << 20):
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def census_cache_key(chunk_size, chunk_overlap, model_name, index_type="flat"):
+    """
+    Derive the cache key for a census index from the splitter settings,
+    embedding model and FAISS index type. Changes to the PDFs themselves are tracked per file in the
+    index manifest and applied incrementally.
+    """
+    settings = {"chunk_size": chunk_size, "chunk_overlap": chunk_overlap, "model": model_name}
+    if index_type != "flat":
+        # Flat indexes keep their original key so existing caches stay valid
+        settings["index_type"] = index_type
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def census_fingerprints(directory):
+    """Map each PDF file name in the directory to its content fingerprint."""
+    return {
+        file: file_fingerprint(os.path.join(directory, file))
+        for file in sorted(os.listdir(directory))
+        if file.endswith(".pdf")
+    }
+
+
+def chunk_id_for(file, fingerprint, i):
+    """Stable ID of the i-th chunk of one version of a PDF."""
+    return f"{file}:{fingerprint[:12]}:{i}"
+
+
+def chunk_ids_for(file, fingerprint, count):
+    """Stable IDs for the chunks of one version of a PDF."""
+    return [chunk_id_for(file, fingerprint, i) for i in range(count)]
+
+
+def load_manifest(index_path):
+    manifest_path = os.path.join(index_path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_index(index_path, embeddings, nprobe=IVF_NPROBE, ef_search=HNSW_EF_SEARCH, **index_params):
+    """
+    Load a persisted index and its manifest, with the query-time knobs applied.
+    Returns (None, {}) if nothing has been saved at `index_path` yet.
+    """
+    if not os.path.exists(os.path.join(index_path, "index.faiss")):
+        return None, {}
+    # The pickle was written by this process family, so deserialising it is safe
+    vectorstore = FAISS.load_local(index_path, embeddings, allow_dangerous_deserialization=True)
+    tune_index(vectorstore.index, nprobe=nprobe, ef_search=ef_search)
+    return vectorstore, load_manifest(index_path)
+
+
+def save_index(vectorstore, manifest, index_path):
+    """Persist the index and its manifest, replacing the previous copy atomically."""
+    # Write to a temporary directory first so an interrupted save never looks like a valid cache entry
+    tmp_path = index_path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    vectorstore.save_local(tmp_path)
+    with open(os.path.join(tmp_path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    shutil.rmtree(index_path, ignore_errors=True)
+    os.replace(tmp_path, index_path)
+
+
+# Process and store the text as embeddings, only re-embedding PDFs that were added or changed
+def create_census_vectorstore(directory=CENSUS_DIR, cache_dir=INDEX_CACHE_DIR,
+                              chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP,
+                              model_name=EMBEDDING_MODEL, index_type=VECTOR_INDEX_TYPE, **index_params):
+    """
+    Load the persisted census index and bring it in line with the PDFs on disk.
+
+    `index_type` selects the FAISS index ("flat", "hnsw", "ivf_flat" or
+    "ivf_pq"); `index_params` are passed to index_factory.build_vectorstore.
+    """
+    # Generate embeddings through the shared batched, cached embedding layer
+    embeddings = get_embeddings(model_name)
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+    index_path = os.path.join(cache_dir, census_cache_key(chunk_size, chunk_overlap, embeddings.model_name, index_type))
+    vectorstore, manifest = load_index(index_path, embeddings, **index_params)
+
+    current = census_fingerprints(directory)
+    removed = [file for file in manifest if current.get(file) != manifest[file]["fingerprint"]]
+    added = [file for file, fingerprint in current.items()
+             if file not in manifest or manifest[file]["fingerprint"] != fingerprint]
+
+    if not removed and not added:
+        print(f"Census index at {index_path} is up to date")
+        return vectorstore
+
+    # Drop the vectors of files that were deleted or have changed since the last run
+    stale_ids = [chunk_id for file in removed for chunk_id in manifest[file]["chunk_ids"]]
+    if stale_ids and not supports_removal(vectorstore):
+        # Only flat indexes can drop vectors safely: rebuild from scratch (embeddings come from the cache)
+        vectorstore, manifest, removed = None, {}, list(manifest)
+        added = list(current)
+    elif stale_ids:
+        vectorstore.delete(stale_ids)
+    for file in removed:
+        manifest.pop(file, None)
+
+    # Stream the new or modified files through extract -> split -> embed -> index in batches
+    chunk_counts = {file: 0 for file in added}
+
+    def chunk_id(chunk):
+        file = os.path.basename(chunk.metadata["source"])
+        chunk_counts[file] += 1
+        return chunk_id_for(file, current[file], chunk_counts[file] - 1)
+
+    # Repeated headers, footers and source notes are dropped before embedding. Duplicates are
+    # only merged within one PDF so removing a file never orphans another file's content.
+    deduplicator = ChunkDeduplicator(scope=lambda chunk: chunk.metadata["source"])
+    pages = iter_pdf_pages([os.path.join(directory, file) for file in added])
+    vectorstore = ingest_documents(pages, embeddings, text_splitter, vectorstore=vectorstore,
+                                   chunk_id=chunk_id, deduplicator=deduplicator,
+                                   index_type=index_type, **index_params)
+    if vectorstore is not None:
+        report = deduplicator.report(dim=vectorstore.index.d)
+        print(f"Deduplication: {report['chunks_in']} chunks -> {report['chunks_out']} "
+              f"({report['exact_duplicates']} exact, {report['near_duplicates']} near duplicates; "
+              f"{report['embedded_chars_saved_pct']:.1f}% of embedded text and "
+              f"{report['index_bytes_saved']} index bytes saved)")
+    for file in added:
+        manifest[file] = {"fingerprint": current[file],
+                          "chunk_ids": chunk_ids_for(file, current[file], chunk_counts[file])}
+
+    print(f"Census index updated: {len(added)} file(s) embedded, {len(removed)} file(s) removed")
+    if vectorstore is not None:
+        save_index(vectorstore, manifest, index_path)
+        print(f"Saved census index to {index_path}")
+
+    return vectorstore
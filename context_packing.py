@@ -0,0 +1,167 @@
+import os
+import re
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+
+# Upper bound on the retrieved text stuffed into the prompt's <context> block. The default matches
+# what as_retriever() used to send (k=4 chunks of up to 1000 characters), so packing never grows prompts
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "1000"))
+
+# Chunks fetched before packing; merging overlaps usually leaves fewer, longer passages
+CONTEXT_FETCH_K = int(os.getenv("CONTEXT_FETCH_K", "6"))
+
+# Shortest text overlap taken to mean two chunks are neighbours rather than a coincidence
+MIN_OVERLAP_CHARS = 20
+
+# Whitespace the splitter may strip between two adjacent chunks
+MAX_GAP_CHARS = 2
+
+# A passage that doesn't fit is truncated only if at least this many tokens of room remain
+MIN_PARTIAL_TOKENS = 64
+
+
+def count_tokens(text):
+    """Rough token count (~4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+def same_page(doc):
+    """Chunks can only be merged with chunks from the same source page."""
+    return doc.metadata.get("source"), doc.metadata.get("page")
+
+
+def merge_text(first, second):
+    """
+    Join two chunks if the end of `first` overlaps the start of `second` or
+    one contains the other; return None if they are not neighbours.
+    """
+    if second in first:
+        return first
+    if first in second:
+        return second
+    probe = second[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return None
+    start = first.find(probe, max(0, len(first) - len(second)))
+    while start != -1:
+        if second.startswith(first[start:]):
+            return first + second[len(first) - start:]
+        start = first.find(probe, start + 1)
+    return None
+
+
+def merge_by_offset(first, second):
+    """
+    Join two chunks using the splitter's `start_index` (add_start_index=True);
+    return (text, start) or None if they neither overlap nor touch.
+    """
+    a, b = sorted((first, second), key=lambda d: d.metadata["start_index"])
+    a_start, b_start = a.metadata["start_index"], b.metadata["start_index"]
+    a_end = a_start + len(a.page_content)
+    gap = b_start - a_end
+    if gap > MAX_GAP_CHARS:
+        return None
+    if gap > 0:
+        # Stand-in for stripped whitespace, same length so later offsets stay exact
+        return a.page_content + "\n" * gap + b.page_content, a_start
+    return a.page_content + b.page_content[-gap:], a_start
+
+
+def merge_pair(first, second):
+    """Merge `second` into the higher-ranked passage `first`, or return None if they don't touch."""
+    if "start_index" in first.metadata and "start_index" in second.metadata:
+        merged = merge_by_offset(first, second)
+    else:
+        text = merge_text(first.page_content, second.page_content) or merge_text(second.page_content, first.page_content)
+        merged = (text, None) if text is not None else None
+    if merged is None:
+        return None
+    text, start = merged
+    metadata = dict(first.metadata)
+    metadata["merged_chunks"] = first.metadata.get("merged_chunks", 1) + second.metadata.get("merged_chunks", 1)
+    if start is not None:
+        metadata["start_index"] = start
+    return Document(page_content=text, metadata=metadata)
+
+
+def _normalized(text):
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut `text` to about `max_tokens`, at the last sentence or word boundary that fits."""
+    cut = text[:max(0, max_tokens - 1) * 4]
+    for boundary in (". ", "\n", " "):
+        end = cut.rfind(boundary)
+        if end > len(cut) // 2:
+            return cut[:end + 1].rstrip()
+    return cut
+
+
+def pack_documents(scored_docs, max_tokens=CONTEXT_MAX_TOKENS):
+    """
+    Pack `(document, score)` pairs, most relevant first, into a context of
+    about `max_tokens`.
+
+    Overlapping or adjacent chunks from the same page are merged into one
+    passage ranked at its best member's position, passages whose text already
+    appears in a higher-ranked passage are dropped, and passages are then added
+    in relevance order until the budget is spent (the last one may be
+    truncated). Each packed document keeps its best `score` in its metadata.
+    """
+    passages = []  # [(rank, document)]
+    for rank, (doc, score) in enumerate(scored_docs):
+        doc = Document(page_content=doc.page_content, metadata={**doc.metadata, "score": float(score)})
+        best = rank
+        i = 0
+        while i < len(passages):
+            other_rank, other = passages[i]
+            combined = merge_pair(other, doc) if same_page(other) == same_page(doc) else None
+            if combined is None:
+                i += 1
+                continue
+            # The merged passage may now touch another one; rescan from the start
+            doc, best = combined, min(best, other_rank)
+            del passages[i]
+            i = 0
+        passages.append((best, doc))
+    passages.sort(key=lambda p: p[0])
+
+    packed, seen, remaining = [], [], max_tokens
+    for _, doc in passages:
+        text = _normalized(doc.page_content)
+        if any(text in other for other in seen):
+            continue  # Redundant: already covered by a more relevant passage
+        cost = count_tokens(doc.page_content)
+        if cost > remaining:
+            if remaining >= MIN_PARTIAL_TOKENS:
+                doc = Document(page_content=truncate_to_tokens(doc.page_content, remaining),
+                               metadata={**doc.metadata, "truncated": True})
+                packed.append(doc)
+            break
+        packed.append(doc)
+        seen.append(text)
+        remaining -= cost
+    return packed
+
+
+class PackedRetriever(BaseRetriever):
+    """
+    Retriever that fetches `fetch_k` chunks with their similarity scores and
+    packs them into at most `max_tokens` of context with `pack_documents`.
+
+    A drop-in replacement for `vectorstore.as_retriever()` in
+    `create_retrieval_chain`; being a retriever, it still reports the
+    `retrieve` stage to the latency callbacks.
+    """
+
+    vectorstore: VectorStore
+    fetch_k: int = CONTEXT_FETCH_K
+    max_tokens: int = CONTEXT_MAX_TOKENS
+
+    def _get_relevant_documents(self, query, *, run_manager: CallbackManagerForRetrieverRun):
+        scored_docs = self.vectorstore.similarity_search_with_score(query, k=self.fetch_k)
+        return pack_documents(scored_docs, max_tokens=self.max_tokens)
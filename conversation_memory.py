@@ -0,0 +1,153 @@
+import json
+import os
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+# Prompt budget for the history sent to the model on each chatbot turn (Gemma2-9b-It has an 8k context)
+MEMORY_MAX_TOKENS = int(os.getenv("MEMORY_MAX_TOKENS", "3000"))
+
+# Tool outputs from earlier turns are cut to this many characters
+TOOL_OUTPUT_PREVIEW_CHARS = int(os.getenv("TOOL_OUTPUT_PREVIEW_CHARS", "200"))
+
+# Characters of each dropped question/answer kept in the summary of earlier turns
+SUMMARY_PREVIEW_CHARS = 120
+
+
+def estimate_tokens(message):
+    """Rough token count of a message (~4 characters per token), including its tool calls."""
+    text = message.content if isinstance(message.content, str) else json.dumps(message.content, default=str)
+    if isinstance(message, AIMessage) and message.tool_calls:
+        text += json.dumps(message.tool_calls, default=str)
+    return len(text) // 4 + 4
+
+
+def split_turns(messages):
+    """
+    Split a history into (system_messages, turns), where each turn starts at a
+    user message and holds the assistant and tool messages that follow it.
+    Cutting only at turn boundaries keeps tool calls paired with their results.
+    """
+    system, turns = [], []
+    for message in messages:
+        if isinstance(message, SystemMessage) and not turns:
+            system.append(message)
+        elif isinstance(message, HumanMessage) or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    return system, turns
+
+
+def _preview(text, limit):
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def compact_tool_output(message, limit=TOOL_OUTPUT_PREVIEW_CHARS):
+    """Replace a bulky tool result with a short reference to it."""
+    content = str(message.content)
+    if len(content) <= limit:
+        return message
+    return ToolMessage(
+        content=f"[{message.name or 'tool'} output, {len(content)} chars, truncated] {_preview(content, limit)}",
+        name=message.name,
+        tool_call_id=message.tool_call_id,
+    )
+
+
+def compact_current_turn(turn, max_tokens):
+    """
+    Fit the turn in progress to roughly `max_tokens`.
+
+    Results of earlier tool rounds (everything before the latest assistant
+    message with tool calls) are replaced with short references, since the
+    model has already read them. If that is still over budget, the oldest
+    rounds are dropped whole, and finally the latest round's tool outputs
+    are cut to share what is left. The question is always kept.
+    """
+    last_call = max((i for i, m in enumerate(turn) if isinstance(m, AIMessage) and m.tool_calls), default=None)
+    if last_call is None:
+        return list(turn)
+    head = turn[0]
+    rounds = []
+    for message in turn[1:last_call]:
+        if isinstance(message, AIMessage) or not rounds:
+            rounds.append([])
+        rounds[-1].append(compact_tool_output(message) if isinstance(message, ToolMessage) else message)
+    latest = list(turn[last_call:])
+
+    def cost(messages):
+        return sum(estimate_tokens(m) for m in messages)
+
+    budget = max_tokens - estimate_tokens(head)
+    while rounds and cost([m for r in rounds for m in r]) + cost(latest) > budget:
+        rounds.pop(0)
+    outputs = [m for m in latest if isinstance(m, ToolMessage)]
+    if outputs and cost(latest) > budget:
+        # Characters left for each tool output once the other messages are paid for
+        limit = max((budget - cost(m for m in latest if not isinstance(m, ToolMessage))) * 4 // len(outputs) - 80, 0)
+        latest = [compact_tool_output(m, limit) if isinstance(m, ToolMessage) else m for m in latest]
+    return [head] + [m for r in rounds for m in r] + latest
+
+
+def summarize_turns(turns):
+    """One-line-per-turn extractive summary of dropped turns: the question and the final answer."""
+    lines = []
+    for turn in turns:
+        question = _preview(turn[0].content, SUMMARY_PREVIEW_CHARS)
+        answers = [m for m in turn if isinstance(m, AIMessage) and not m.tool_calls and m.content]
+        answer = _preview(answers[-1].content, SUMMARY_PREVIEW_CHARS) if answers else "(no answer)"
+        lines.append(f"- Q: {question} A: {answer}")
+    return SystemMessage(content="Summary of earlier conversation:\n" + "\n".join(lines))
+
+
+def compact_messages(messages, max_tokens=MEMORY_MAX_TOKENS, summarize=summarize_turns):
+    """
+    Return the history to send to the model, fitted to roughly `max_tokens`.
+
+    The current (last) turn comes first and is fitted with
+    compact_current_turn, so a single question with many tool rounds stays
+    bounded too. Tool outputs from earlier turns are replaced with short
+    references; if the history is still over budget, the oldest turns are
+    dropped and `summarize(dropped_turns)`, a callable returning a message (or
+    None to drop them silently), takes their place. The graph state itself is
+    left untouched.
+    """
+    system, turns = split_turns(messages)
+    if not turns:
+        return list(messages)
+
+    current = compact_current_turn(turns[-1], max_tokens - sum(estimate_tokens(m) for m in system))
+    earlier = [[compact_tool_output(m) if isinstance(m, ToolMessage) else m for m in turn] for turn in turns[:-1]]
+
+    # Keep the newest earlier turns that fit next to the system prompt and the current turn,
+    # leaving a quarter of the budget for the summary of whatever has to be dropped
+    budget = max_tokens - sum(estimate_tokens(m) for m in system + current)
+    turns_budget = budget - (max_tokens // 4 if summarize else 0)
+    kept, used = [], 0
+    for turn in reversed(earlier):
+        cost = sum(estimate_tokens(m) for m in turn)
+        if used + cost > turns_budget:
+            break
+        kept.insert(0, turn)
+        used += cost
+
+    dropped = earlier[:len(earlier) - len(kept)]
+    summary = summarize(dropped) if dropped and summarize else None
+    if summary is not None:
+        # The summary of a long session is itself bounded: keep only its newest lines
+        header, *lines = summary.content.splitlines()
+        chars = (budget - used - 4) * 4 - len(header)
+        start = len(lines)
+        while start > 0 and chars - len(lines[start - 1]) - 1 >= 0:
+            start -= 1
+            chars -= len(lines[start]) + 1
+        summary = SystemMessage(content="\n".join([header] + lines[start:])) if start < len(lines) else None
+
+    compacted = list(system)
+    if summary is not None:
+        compacted.append(summary)
+    for turn in kept:
+        compacted.extend(turn)
+    compacted.extend(current)
+    return compacted
@@ -0,0 +1,311 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import Counter
+from urllib.parse import urljoin, urlsplit
+from urllib.robotparser import RobotFileParser
+
+import aiohttp
+
+from instrumentation import percentile, record
+from web_cache import USER_AGENT, WEB_FETCH_TIMEOUT_SECONDS, WebPage, WebPageCache, update_web_vectorstore
+
+# Requests in flight per host, and across all hosts (the size of the shared connection pool)
+CRAWL_PER_HOST = int(os.getenv("CRAWL_PER_HOST", "4"))
+CRAWL_MAX_CONNECTIONS = int(os.getenv("CRAWL_MAX_CONNECTIONS", "32"))
+
+# One JSON line per URL: outcome, HTTP status, timing and error
+CRAWL_REPORT_PATH = "./metrics/crawl_report.jsonl"
+
+# Parsed pages waiting for the splitter/embedder; the crawl pauses when it is full
+PAGE_QUEUE_SIZE = 64
+
+SITEMAP_NS = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+
+_DONE = object()
+
+
+def read_sources(sources):
+    """
+    URLs from a file (one per line, # comments allowed) or a comma-separated string.
+    Sitemap URLs are kept as they are and expanded by the crawler.
+    """
+    if os.path.isfile(sources):
+        with open(sources, encoding="utf-8") as f:
+            lines = [line.strip() for line in f]
+    else:
+        lines = [s.strip() for s in sources.split(",")]
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def crawl_index_name(sources):
+    """
+    Index name for a crawl of `sources` (the WEB_SOURCES value or crawler.py argument).
+    Kept apart from the single-URL title_insurance_web index: update_web_vectorstore drops
+    every URL it isn't given, so sharing one index would delete the other's pages.
+    """
+    return "title_insurance_crawl-" + hashlib.sha256(sources.encode("utf-8")).hexdigest()[:12]
+
+
+def is_sitemap(url):
+    path = urlsplit(url).path.lower()
+    return path.endswith(".xml") or "sitemap" in path.rsplit("/", 1)[-1]
+
+
+def parse_sitemap(xml):
+    """(page URLs, nested sitemap URLs) listed in a sitemap or sitemap index."""
+    root = ET.fromstring(xml)
+    locs = [loc.text.strip() for loc in root.iter(SITEMAP_NS + "loc") if loc.text]
+    if root.tag == SITEMAP_NS + "sitemapindex":
+        return [], locs
+    return locs, []
+
+
+class Crawler:
+    """
+    Asynchronous crawler that feeds web pages to the indexing pipeline.
+
+    All requests share one aiohttp connection pool. Each host gets its own
+    semaphore (a single slot when robots.txt sets a Crawl-delay), robots.txt
+    is fetched once per host and honoured, and every request has a timeout.
+    Pages go through the WebPageCache, so revalidation uses conditional GETs
+    and a failed fetch falls back to the cached copy. Each URL's outcome is
+    kept in `report`.
+    """
+
+    def __init__(self, page_cache=None, per_host=CRAWL_PER_HOST, max_connections=CRAWL_MAX_CONNECTIONS,
+                 timeout=WEB_FETCH_TIMEOUT_SECONDS, user_agent=USER_AGENT, respect_robots=True):
+        self.page_cache = page_cache or WebPageCache()
+        self.per_host = per_host
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self.respect_robots = respect_robots
+        self.report = []
+        self._robots = {}
+        self._robots_locks = {}
+        self._host_slots = {}
+        self._next_request_at = {}
+
+    async def _get(self, session, url, headers=None):
+        async with session.get(url, headers=headers) as response:
+            body = await response.read()
+            return response.status, body, response.headers
+
+    async def _robots_for(self, session, url):
+        """Parsed robots.txt of the URL's host, or None when robots are ignored."""
+        if not self.respect_robots:
+            return None
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        lock = self._robots_locks.setdefault(origin, asyncio.Lock())
+        async with lock:
+            if origin not in self._robots:
+                robots = RobotFileParser(origin + "/robots.txt")
+                try:
+                    status, body, _ = await self._get(session, origin + "/robots.txt")
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    status = None
+                # Same rules as RobotFileParser.read(): auth errors disallow everything,
+                # a missing or unreachable robots.txt allows everything
+                if status in (401, 403):
+                    robots.disallow_all = True
+                elif status is not None and status < 400:
+                    robots.parse(body.decode("utf-8", errors="replace").splitlines())
+                else:
+                    robots.allow_all = True
+                self._robots[origin] = robots
+            return self._robots[origin]
+
+    def _slot(self, host, robots):
+        if host not in self._host_slots:
+            delay = robots.crawl_delay(self.user_agent) if robots else None
+            self._host_slots[host] = asyncio.Semaphore(1 if delay else self.per_host)
+            self._next_request_at[host] = 0.0
+        return self._host_slots[host]
+
+    async def _wait_for_crawl_delay(self, host, robots):
+        delay = robots.crawl_delay(self.user_agent) if robots else None
+        if not delay:
+            return
+        wait = self._next_request_at[host] - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        self._next_request_at[host] = time.monotonic() + float(delay)
+
+    async def expand(self, session, sources):
+        """Replace sitemap URLs in `sources` by the pages they list; duplicates are dropped."""
+        urls, seen_sitemaps = [], set()
+        pending = list(sources)
+        while pending:
+            source = pending.pop(0)
+            if not is_sitemap(source):
+                urls.append(source)
+                continue
+            if source in seen_sitemaps:
+                continue
+            seen_sitemaps.add(source)
+            try:
+                status, body, _ = await self._get(session, source)
+                if status >= 400:
+                    self._report(source, "error", status, error=f"sitemap: HTTP {status}")
+                    continue
+                pages, sitemaps = parse_sitemap(body)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ET.ParseError) as e:
+                self._report(source, "error", error=f"sitemap: {e!r}")
+                continue
+            urls.extend(urljoin(source, page) for page in pages)
+            pending.extend(urljoin(source, sitemap) for sitemap in sitemaps)
+        return list(dict.fromkeys(urls))
+
+    def _report(self, url, outcome, http_status=None, seconds=None, size=None, error=None):
+        self.report.append({"url": url, "outcome": outcome, "http_status": http_status,
+                            "fetch_seconds": seconds, "bytes": size, "error": error})
+
+    async def fetch_page(self, session, url):
+        """Fetch and parse one page; returns a WebPage, or None if it was skipped or failed without a cached copy."""
+        robots = await self._robots_for(session, url)
+        if robots is not None and not robots.can_fetch(self.user_agent, url):
+            self._report(url, "robots_disallowed")
+            return None
+        host = urlsplit(url).netloc
+        meta, document = self.page_cache.cached(url)
+        async with self._slot(host, robots):
+            await self._wait_for_crawl_delay(host, robots)
+            start = time.perf_counter()
+            status = error = None
+            try:
+                status, body, headers = await self._get(session, url, self.page_cache.conditional_headers(meta))
+                if status >= 400:
+                    error = f"HTTP {status}"
+            except asyncio.TimeoutError:
+                error = f"timed out after {self.timeout} s"
+            except aiohttp.ClientError as e:
+                error = str(e) or repr(e)
+            elapsed = time.perf_counter() - start
+        record("crawl_fetch", elapsed)
+        if error is not None:
+            if document is None:
+                self._report(url, "error", status, elapsed, error=error)
+                return None
+            print(f"Fetching {url} failed ({error}); using the cached copy")
+            self._report(url, "offline", status, elapsed, error=error)
+            return WebPage(url, document, meta["content_hash"], "offline", elapsed, error)
+        try:
+            # Parsing and the cache writes are blocking work, so keep them off the event loop
+            page = await asyncio.to_thread(self.page_cache.page_from_response, url, meta, document, status, body,
+                                           headers, elapsed)
+        except Exception as e:
+            self._report(url, "error", status, elapsed, len(body), error=f"parse: {e!r}")
+            return None
+        self._report(url, page.status, status, elapsed, len(body))
+        return page
+
+    async def crawl(self, sources):
+        """Yield WebPages as they finish downloading, in completion order."""
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.per_host)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         headers={"User-Agent": self.user_agent}) as session:
+            urls = await self.expand(session, sources)
+            tasks = [asyncio.ensure_future(self.fetch_page(session, url)) for url in urls]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    page = await next_done
+                    if page is not None:
+                        yield page
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+    def iter_pages(self, sources):
+        """
+        Run the crawl on a background event loop and yield its pages here as
+        they arrive, so splitting and embedding overlap with downloading.
+        """
+        pages = queue.Queue(maxsize=PAGE_QUEUE_SIZE)
+        stop = threading.Event()
+
+        async def produce():
+            async for page in self.crawl(sources):
+                if stop.is_set():
+                    break
+                await asyncio.to_thread(pages.put, page)
+
+        def run():
+            try:
+                asyncio.run(produce())
+            except BaseException as e:
+                pages.put(e)
+            finally:
+                pages.put(_DONE)
+
+        thread = threading.Thread(target=run, name="crawler", daemon=True)
+        thread.start()
+        try:
+            while (item := pages.get()) is not _DONE:
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            # The consumer stopped early: let the crawl wind down instead of blocking on a full queue
+            stop.set()
+            while thread.is_alive():
+                try:
+                    pages.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+
+    def summary(self):
+        outcomes = Counter(entry["outcome"] for entry in self.report)
+        timings = sorted(entry["fetch_seconds"] for entry in self.report if entry["fetch_seconds"] is not None)
+        return {"urls": len(self.report), "outcomes": dict(outcomes),
+                "fetch_p50": percentile(timings, 50), "fetch_p95": percentile(timings, 95)}
+
+    def write_report(self, path=CRAWL_REPORT_PATH):
+        """Write one JSON line per URL, slowest first, and print a summary."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        entries = sorted(self.report, key=lambda entry: -(entry["fetch_seconds"] or 0))
+        with open(path, "w", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+        summary = self.summary()
+        print(f"Crawled {summary['urls']} URL(s): {summary['outcomes']}, fetch p50 {summary['fetch_p50']} s, "
+              f"p95 {summary['fetch_p95']} s. Report: {path}")
+        return summary
+
+
+def crawl_web_vectorstore(name, sources, crawler=None, report_path=CRAWL_REPORT_PATH, **kwargs):
+    """Crawl `sources` (URLs and sitemaps) and stream the pages into the index `name`."""
+    crawler = crawler or Crawler()
+    try:
+        return update_web_vectorstore(name, crawler.iter_pages(sources), **kwargs)
+    finally:
+        crawler.write_report(report_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawl a list of URLs or sitemaps into a persisted web index.")
+    parser.add_argument("sources", help="File with one URL per line, or comma-separated URLs; sitemaps are expanded")
+    parser.add_argument("--name", help="Index name (default: derived from SOURCES, as app.py does for WEB_SOURCES)")
+    parser.add_argument("--per-host", type=int, default=CRAWL_PER_HOST)
+    parser.add_argument("--max-connections", type=int, default=CRAWL_MAX_CONNECTIONS)
+    parser.add_argument("--timeout", type=float, default=WEB_FETCH_TIMEOUT_SECONDS)
+    parser.add_argument("--ignore-robots", action="store_true")
+    parser.add_argument("--report", default=CRAWL_REPORT_PATH)
+    args = parser.parse_args()
+
+    crawler = Crawler(per_host=args.per_host, max_connections=args.max_connections, timeout=args.timeout,
+                      respect_robots=not args.ignore_robots)
+    start = time.perf_counter()
+    crawl_web_vectorstore(args.name or crawl_index_name(args.sources), read_sources(args.sources), crawler=crawler, report_path=args.report,
+                          chunk_size=1000, chunk_overlap=200)
+    print(f"Done in {time.perf_counter() - start:.1f} s")
@@ -0,0 +1,160 @@
+import hashlib
+import re
+import struct
+
+# MinHash / LSH settings: 16 bands of 8 rows detect pairs above roughly 0.7 Jaccard similarity,
+# which are then confirmed against NEAR_DUPLICATE_THRESHOLD
+NUM_PERM = 128
+LSH_BANDS = 16
+SHINGLE_SIZE = 5
+NEAR_DUPLICATE_THRESHOLD = 0.85
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def normalize_text(text):
+    """Lower-case and collapse whitespace; digits are kept so different tables stay distinct."""
+    return re.sub(r"\s+", " ", text.lower()).strip()
+
+
+def _permutations(num_perm, seed=1):
+    # Deterministic (a, b) pairs for the universal hash family h(x) = (a * x + b) mod p
+    params = []
+    for i in range(num_perm):
+        digest = hashlib.sha256(f"{seed}:{i}".encode("ascii")).digest()
+        a, b = struct.unpack("<QQ", digest[:16])
+        params.append((a % (_MERSENNE_PRIME - 1) + 1, b % _MERSENNE_PRIME))
+    return params
+
+
+_PERMUTATIONS = _permutations(NUM_PERM)
+
+
+def minhash_signature(text, shingle_size=SHINGLE_SIZE):
+    """MinHash signature over the word shingles of already normalised text."""
+    words = text.split()
+    if len(words) < shingle_size:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)}
+    hashes = [int.from_bytes(hashlib.md5(s.encode("utf-8")).digest()[:4], "little") for s in shingles]
+    return tuple(
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def estimated_jaccard(sig_a, sig_b):
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / len(sig_a)
+
+
+class ChunkDeduplicator:
+    """
+    Drops exact and near-duplicate chunks before they are embedded.
+
+    Exact duplicates are found by hashing the normalised text; near duplicates
+    by MinHash signatures bucketed with LSH and confirmed by estimated Jaccard
+    similarity. The first chunk seen is kept as the representative and records
+    the pages of every chunk merged into it, see `merge_metadata`.
+
+    Args:
+        threshold (float): Minimum estimated Jaccard similarity for a near duplicate.
+        scope (callable): Optional function mapping a chunk to a scope key;
+            chunks are only compared within the same scope (e.g. per source
+            file, so removing one file never orphans another file's content).
+    """
+
+    def __init__(self, threshold=NEAR_DUPLICATE_THRESHOLD, scope=None):
+        self.threshold = threshold
+        self.scope = scope
+        self._exact = {}
+        self._buckets = {}
+        self._signatures = {}
+        self._merged_pages = {}
+        self.chunks_in = 0
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+        self.chars_in = 0
+        self.chars_dropped = 0
+
+    @staticmethod
+    def _page_of(chunk):
+        return {"source": chunk.metadata.get("source"), "page": chunk.metadata.get("page")}
+
+    def _find_near_duplicate(self, scope, signature):
+        rows = NUM_PERM // LSH_BANDS
+        candidates = set()
+        for band in range(LSH_BANDS):
+            key = (scope, band, signature[band * rows:(band + 1) * rows])
+            candidates.update(self._buckets.get(key, ()))
+        best, best_similarity = None, 0.0
+        for candidate in candidates:
+            similarity = estimated_jaccard(signature, self._signatures[candidate])
+            if similarity > best_similarity:
+                best, best_similarity = candidate, similarity
+        return best if best_similarity >= self.threshold else None
+
+    def _remember(self, scope, chunk_hash, signature):
+        rows = NUM_PERM // LSH_BANDS
+        self._signatures[chunk_hash] = signature
+        for band in range(LSH_BANDS):
+            key = (scope, band, signature[band * rows:(band + 1) * rows])
+            self._buckets.setdefault(key, []).append(chunk_hash)
+
+    def filter(self, chunks):
+        """Yield only the chunks that are not duplicates of an earlier chunk."""
+        for chunk in chunks:
+            self.chunks_in += 1
+            self.chars_in += len(chunk.page_content)
+            scope = self.scope(chunk) if self.scope else None
+            text = normalize_text(chunk.page_content)
+            chunk_hash = hashlib.sha256(f"{scope}\0{text}".encode("utf-8")).hexdigest()
+
+            representative = self._exact.get(chunk_hash)
+            if representative is not None:
+                self.exact_duplicates += 1
+            else:
+                signature = minhash_signature(text)
+                representative = self._find_near_duplicate(scope, signature)
+                if representative is not None:
+                    self.near_duplicates += 1
+                    self._exact[chunk_hash] = representative
+                else:
+                    self._exact[chunk_hash] = chunk_hash
+                    self._remember(scope, chunk_hash, signature)
+                    self._merged_pages[chunk_hash] = [self._page_of(chunk)]
+                    chunk.metadata["chunk_hash"] = chunk_hash
+                    yield chunk
+                    continue
+
+            self.chars_dropped += len(chunk.page_content)
+            page = self._page_of(chunk)
+            if page not in self._merged_pages[representative]:
+                self._merged_pages[representative].append(page)
+
+    def merge_metadata(self, vectorstore):
+        """Record on each indexed representative the pages of the duplicates merged into it."""
+        if vectorstore is None:
+            return
+        for doc in vectorstore.docstore._dict.values():
+            pages = self._merged_pages.get(doc.metadata.get("chunk_hash"))
+            if pages and len(pages) > 1:
+                doc.metadata["pages"] = pages
+
+    def report(self, dim=None):
+        """Summary of the embedding work and index space saved by deduplication."""
+        dropped = self.exact_duplicates + self.near_duplicates
+        report = {
+            "chunks_in": self.chunks_in,
+            "chunks_out": self.chunks_in - dropped,
+            "exact_duplicates": self.exact_duplicates,
+            "near_duplicates": self.near_duplicates,
+            "embedding_calls_saved": dropped,
+            "embedded_chars_saved": self.chars_dropped,
+            "embedded_chars_saved_pct": 100.0 * self.chars_dropped / self.chars_in if self.chars_in else 0.0,
+        }
+        if dim:
+            # Flat float32 vectors; approximate indexes save proportionally
+            report["index_bytes_saved"] = dropped * dim * 4
+        return report
@@ -1,18 +1,26 @@
 import streamlit as st
 import os
-from langchain_groq import ChatGroq
+from llm_router import get_chat_model
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain_core.prompts import ChatPromptTemplate
 from langchain.chains import create_retrieval_chain
-from langchain_community.vectorstores import FAISS
-from langchain_community.document_loaders import PyPDFDirectoryLoader
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from ingest import ingest_documents
+from dedup import ChunkDeduplicator
+from census_store import iter_census_pdfs
+from embedding_cache import get_embeddings
+from vector_registry import get_vectorstore, invalidate, peek_vectorstore
+from rag_streaming import StreamedAnswer
+from context_packing import PackedRetriever
+from semantic_cache import get_semantic_cache
+from instrumentation import export_metrics, serve_metrics
 from dotenv import load_dotenv
-import time
 import os
 load_dotenv()   
 
+# Expose per-stage latency histograms on http://127.0.0.1:$METRICS_PORT/ when METRICS_PORT is set
+serve_metrics()
+
 ## Load the GROQ and OpenAI API KEY 
 groq_api_key = os.getenv('GROQ_API_KEY')
 os.environ["GOOGLE_API_KEY"] = os.getenv("GOOGLE_API_KEY")
@@ -20,8 +28,8 @@ os.environ["GOOGLE_API_KEY"] = os.getenv("GOOGLE_API_KEY")
 # Set the title of the Streamlit app
 st.title("Gemma Model Document Q&A")
     
-# Initialize the ChatGroq model with the provided API key and model name
-llm = ChatGroq(groq_api_key=groq_api_key, model_name="Llama3-8b-8192")
+# Route requests across the configured LLM backends (LLM_ROUTER_MODELS), by default Groq's Llama3-8b-8192
+llm = get_chat_model("Llama3-8b-8192")
 
 # Define the prompt template for the chat model
 prompt = ChatPromptTemplate.from_template(
@@ -35,19 +43,26 @@ Questions:{input}
 """
 )
 
-# Function to create vector embeddings
+CENSUS_CORPUS = "census_pdfs"
+
+
+# Function to create vector embeddings; the result is shared by all sessions in this server process
+def build_census_vectorstore():
+    # Initialize the shared batched, cached embeddings (Google by default, EMBEDDINGS_BACKEND=fake for offline runs)
+    embeddings = get_embeddings()
+    # Split documents into chunks
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, add_start_index=True)
+    # Stream every page of the directory (extracted in parallel) through split -> embed -> FAISS in batches
+    # (flat, hnsw, ivf_flat or ivf_pq via VECTOR_INDEX_TYPE)
+    # Repeated headers, footers and boilerplate are dropped before embedding
+    deduplicator = ChunkDeduplicator()
+    vectors = ingest_documents(iter_census_pdfs("./us_census"), embeddings, text_splitter, deduplicator=deduplicator)
+    print("Deduplication report:", deduplicator.report(dim=vectors.index.d if vectors else None))
+    return vectors
+
+
 def vector_embedding():
-    if "vectors" not in st.session_state:
-        # Initialize embeddings using GoogleGenerativeAIEmbeddings
-        st.session_state.embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-        # Load documents from the specified directory
-        st.session_state.loader = PyPDFDirectoryLoader("./us_census")
-        st.session_state.docs = st.session_state.loader.load()
-        # Split documents into chunks
-        st.session_state.text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        st.session_state.final_documents = st.session_state.text_splitter.split_documents(st.session_state.docs[:20])
-        # Create vector store using FAISS
-        st.session_state.vectors = FAISS.from_documents(st.session_state.final_documents, st.session_state.embeddings) 
+    return get_vectorstore(CENSUS_CORPUS, build_census_vectorstore)
 
 
 # Input field for user to enter their question
@@ -58,27 +73,51 @@ if st.button("Documents Embedding"):
     vector_embedding()
     st.write("Vector Store DB Is Ready")
 
+# Rebuild the shared index, e.g. after PDFs were added to ./us_census
+if st.sidebar.button("Reload index"):
+    invalidate(CENSUS_CORPUS)
 
 
+
+vectors = peek_vectorstore(CENSUS_CORPUS)
+
 # If a question is entered, process it
-if prompt1:
+if prompt1 and vectors is None:
+    st.warning("Click 'Documents Embedding' to build the vector store first.")
+elif prompt1:
     # Create a document chain using the chat model and prompt
     document_chain = create_stuff_documents_chain(llm, prompt)
-    # Retrieve relevant documents using the vector store
-    retriever = st.session_state.vectors.as_retriever()
+    # Retrieve relevant documents using the vector store, merging overlapping chunks into a token-bounded context
+    retriever = PackedRetriever(vectorstore=vectors)
     retrieval_chain = create_retrieval_chain(retriever, document_chain)
-    # Measure the response time
-    start = time.process_time()
-    response = retrieval_chain.invoke({'input': prompt1})
-    print("Response time:", time.process_time() - start)
-    # Display the response
-    st.write(response['answer'])
-
-    # With a Streamlit expander, show the document similarity search results
-    with st.expander("Document Similarity Search"):
-        # Find and display the relevant chunks
-        for i, doc in enumerate(response["context"]):
-            st.write(doc.page_content)
-            st.write("--------------------------------") 
+    # Reserve the answer slot above the retrieved chunks so both render in place as they arrive
+    answer_container = st.container()
+    context_container = st.container()
 
-    
+    # With a Streamlit expander, show the document similarity search results as soon as retrieval finishes
+    def show_context(docs):
+        with context_container.expander("Document Similarity Search"):
+            # Find and display the relevant chunks
+            for doc in docs:
+                st.write(doc.page_content)
+                st.write("--------------------------------")
+
+    # Reuse the answer to a sufficiently similar earlier question without calling the LLM
+    answer_cache = get_semantic_cache(CENSUS_CORPUS)
+    cached = answer_cache.get(prompt1)
+    if cached:
+        with answer_container:
+            st.write(cached["answer"])
+        show_context(cached["context"])
+        print("Semantic cache hit, similarity:", cached["similarity"])
+    else:
+        # Stream the answer tokens as they are generated
+        streamed = StreamedAnswer(retrieval_chain, {'input': prompt1}, on_context=show_context)
+        with answer_container:
+            st.write_stream(streamed.tokens())
+        if streamed.answer:
+            answer_cache.put(prompt1, streamed.answer, streamed.context)
+        # Report time to first token separately from the total response time
+        print("Time to first token:", streamed.time_to_first_token)
+        print("Response time:", streamed.total_latency)
+        export_metrics()  # Per-stage p50/p95/p99 latencies in ./metrics/latency.json
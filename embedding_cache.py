@@ -0,0 +1,229 @@
+import asyncio
+import hashlib
+import os
+import random
+import re
+import sqlite3
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.embeddings import Embeddings
+
+# Default embedding model used by every RAG entry point
+EMBEDDING_MODEL = "models/embedding-001"
+
+# SQLite file holding previously computed vectors, shared by all apps
+EMBEDDING_CACHE_PATH = "./embedding_cache.sqlite"
+
+# Set EMBEDDINGS_BACKEND=fake to use the deterministic local embedder (no network, no API key)
+EMBEDDINGS_BACKEND = os.getenv("EMBEDDINGS_BACKEND", "google")
+
+
+def embedding_cache_key(model_name, kind, text):
+    """Content address of one embedding: hash(model, document/query, text)."""
+    digest = hashlib.sha256()
+    for part in (model_name, kind, text):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class EmbeddingStore:
+    """Persistent key -> float32 vector map backed by SQLite."""
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._conn.commit()
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                )
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+        return found
+
+    def put_many(self, items):
+        rows = [(key, array("f", vector).tobytes()) for key, vector in items]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def is_rate_limit_error(error):
+    """Best-effort detection of provider throttling (HTTP 429 / quota exhausted)."""
+    if getattr(error, "status_code", None) == 429 or getattr(error, "code", None) == 429:
+        return True
+    name = type(error).__name__
+    message = str(error).lower()
+    return (
+        name in ("ResourceExhausted", "RateLimitError", "TooManyRequests")
+        or "429" in message
+        or "rate limit" in message
+        or "quota" in message
+    )
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that batches requests, runs batches concurrently,
+    backs off on rate limits and remembers every vector it has computed.
+
+    Args:
+        embeddings (Embeddings): The provider actually computing vectors.
+        model_name (str): Model identifier, part of every cache key.
+        store (EmbeddingStore): Persistent vector cache. Pass None to disable.
+        batch_size (int): Texts sent to the provider per request.
+        max_concurrency (int): Upper bound on in-flight provider requests.
+        max_retries (int): Attempts per batch before a rate-limit error is raised.
+        initial_backoff (float): First retry delay in seconds, doubled on each retry.
+    """
+
+    def __init__(self, embeddings, model_name, store=None, batch_size=100,
+                 max_concurrency=4, max_retries=6, initial_backoff=1.0):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.store = store
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+
+    async def _call_with_backoff(self, func, *args):
+        delay = self.initial_backoff
+        for attempt in range(self.max_retries):
+            try:
+                return await func(*args)
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt == self.max_retries - 1:
+                    raise
+                # Exponential backoff with jitter so concurrent batches don't retry in lockstep
+                await asyncio.sleep(delay * (1 + random.random()))
+                delay *= 2
+
+    async def _aembed(self, texts, kind):
+        keys = [embedding_cache_key(self.model_name, kind, text) for text in texts]
+        vectors = self.store.get_many(list(set(keys))) if self.store else {}
+
+        # Embed each distinct missing text once, even if it appears several times in the input
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+
+        if missing:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            items = list(missing.items())
+            batches = [items[i:i + self.batch_size] for i in range(0, len(items), self.batch_size)]
+
+            async def run_batch(batch):
+                async with semaphore:
+                    batch_texts = [text for _, text in batch]
+                    if kind == "query":
+                        result = [await self._call_with_backoff(self.embeddings.aembed_query, batch_texts[0])]
+                    else:
+                        result = await self._call_with_backoff(self.embeddings.aembed_documents, batch_texts)
+                computed = [(key, vector) for (key, _), vector in zip(batch, result)]
+                if self.store:
+                    self.store.put_many(computed)
+                vectors.update(computed)
+
+            await asyncio.gather(*(run_batch(batch) for batch in batches))
+
+        return [list(vectors[key]) for key in keys]
+
+    async def aembed_documents(self, texts):
+        return await self._aembed(list(texts), "document")
+
+    async def aembed_query(self, text):
+        return (await self._aembed([text], "query"))[0]
+
+    def _run(self, coroutine):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coroutine)
+        # Called synchronously from inside an event loop: run on a helper thread with its own loop
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, coroutine).result()
+
+    def embed_documents(self, texts):
+        return self._run(self.aembed_documents(texts))
+
+    def embed_query(self, text):
+        return self._run(self.aembed_query(text))
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Deterministic local embedder for offline runs and tests.
+
+    Each word is hashed into one of `size` buckets, so texts sharing words get
+    similar vectors. Vectors are L2-normalised.
+    """
+
+    def __init__(self, size=256):
+        self.size = size
+
+    def _embed(self, text):
+        vector = [0.0] * self.size
+        for word in re.findall(r"\w+", text.lower()):
+            bucket = int.from_bytes(hashlib.md5(word.encode("utf-8")).digest()[:4], "little")
+            vector[bucket % self.size] += 1.0
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_embedding_store(path=EMBEDDING_CACHE_PATH):
+    """Return the process-wide embedding cache, opening it on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = EmbeddingStore(path)
+        return _store
+
+
+def get_embeddings(model_name=EMBEDDING_MODEL, backend=None, **kwargs):
+    """
+    Build the shared, cached embeddings client used by every app.
+
+    `backend` defaults to the EMBEDDINGS_BACKEND environment variable:
+    "google" for GoogleGenerativeAIEmbeddings, "fake" for HashEmbeddings.
+    Extra keyword arguments are passed to CachedEmbeddings.
+    """
+    backend = backend or EMBEDDINGS_BACKEND
+    if backend == "fake":
+        embeddings = HashEmbeddings()
+    else:
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+        embeddings = GoogleGenerativeAIEmbeddings(model=model_name)
+    kwargs.setdefault("store", get_embedding_store())
+    return CachedEmbeddings(embeddings, f"{backend}:{model_name}", **kwargs)
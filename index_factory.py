@@ -0,0 +1,182 @@
+import argparse
+import math
+import os
+import random
+import time
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+# Index used by the census and web vector stores unless overridden
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "flat")
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+
+# Defaults for the approximate indexes
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+IVF_NLIST = 1024
+IVF_NPROBE = 16
+PQ_M = 16
+PQ_NBITS = 8
+TRAIN_SAMPLE_SIZE = 50000
+
+
+def index_spec(index_type, dim, num_vectors, nlist=IVF_NLIST, hnsw_m=HNSW_M, pq_m=PQ_M, pq_nbits=PQ_NBITS):
+    """
+    Translate an index type into a faiss.index_factory description string.
+
+    IVF list counts and PQ code sizes are clamped so small corpora still have
+    enough training points (FAISS wants roughly 39 points per centroid).
+    """
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "hnsw":
+        return f"HNSW{hnsw_m}"
+    nlist = max(1, min(nlist, num_vectors // 39, int(4 * math.sqrt(num_vectors))))
+    if index_type == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    if index_type == "ivf_pq":
+        if dim % pq_m:
+            raise ValueError(f"PQ sub-quantizer count {pq_m} must divide the embedding dimension {dim}")
+        pq_nbits = max(1, min(pq_nbits, int(math.log2(max(2, num_vectors)))))
+        return f"IVF{nlist},PQ{pq_m}x{pq_nbits}"
+    raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+
+
+def tune_index(index, nprobe=None, ef_search=None):
+    """Set the query-time recall/speed knobs of an IVF or HNSW index."""
+    if nprobe is not None:
+        # try_ returns None for non-IVF indexes; extract_index_ivf can crash on them
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.nprobe = nprobe
+    if ef_search is not None and hasattr(index, "hnsw"):
+        index.hnsw.efSearch = ef_search
+    return index
+
+
+def make_index(index_type, vectors, nprobe=IVF_NPROBE, ef_search=HNSW_EF_SEARCH,
+               train_sample_size=TRAIN_SAMPLE_SIZE, seed=0, **spec_params):
+    """Create, train (on a random sample when needed) and tune an empty FAISS index for `vectors`."""
+    num_vectors, dim = vectors.shape
+    # index_factory already returns the concrete index class. downcast_index on a temporary would
+    # return a non-owning proxy whose index is freed as soon as the factory result is collected
+    index = faiss.index_factory(dim, index_spec(index_type, dim, num_vectors, **spec_params))
+    if hasattr(index, "hnsw"):
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    if not index.is_trained:
+        rng = np.random.default_rng(seed)
+        sample = vectors
+        if num_vectors > train_sample_size:
+            sample = vectors[rng.choice(num_vectors, train_sample_size, replace=False)]
+        index.train(sample)
+    return tune_index(index, nprobe=nprobe, ef_search=ef_search)
+
+
+def build_vectorstore(documents, embeddings, index_type=VECTOR_INDEX_TYPE, ids=None, **index_params):
+    """
+    Drop-in replacement for FAISS.from_documents with a configurable index.
+
+    Args:
+        documents (list): Documents to embed and index.
+        embeddings (Embeddings): Embedding model used for documents and queries.
+        index_type (str): One of "flat", "hnsw", "ivf_flat" or "ivf_pq".
+        ids (list): Optional docstore IDs, one per document.
+        **index_params: nprobe, ef_search, nlist, hnsw_m, pq_m, pq_nbits, train_sample_size.
+    """
+    texts = [doc.page_content for doc in documents]
+    vectors = embeddings.embed_documents(texts)
+    return build_vectorstore_from_vectors(texts, vectors, [doc.metadata for doc in documents], embeddings,
+                                          index_type=index_type, ids=ids, **index_params)
+
+
+def build_vectorstore_from_vectors(texts, vectors, metadatas, embeddings, index_type=VECTOR_INDEX_TYPE, ids=None,
+                                   **index_params):
+    """Like build_vectorstore, for chunks whose embeddings have already been computed."""
+    index = make_index(index_type, np.asarray(vectors, dtype=np.float32), **index_params)
+    vectorstore = FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=InMemoryDocstore(),
+        index_to_docstore_id={},
+    )
+    vectorstore.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas, ids=ids)
+    return vectorstore
+
+
+def supports_removal(vectorstore):
+    """
+    Whether vectors can be deleted in place. Only flat indexes qualify: HNSW
+    graphs cannot drop vectors, and IVF remove_ids leaves the remaining ids
+    unchanged while FAISS.delete renumbers its id map, so later adds would
+    collide with ids still in the index.
+    """
+    return isinstance(vectorstore.index, faiss.IndexFlat)
+
+
+def index_memory_bytes(vectorstore):
+    """Size of the serialised FAISS index, a close proxy for its resident memory."""
+    return int(faiss.serialize_index(vectorstore.index).nbytes)
+
+
+def _search_ids(vectorstore, query_vectors, k):
+    _, positions = vectorstore.index.search(query_vectors, k)
+    return [
+        {vectorstore.index_to_docstore_id[p] for p in row if p != -1}
+        for row in positions
+    ]
+
+
+def recall_at_k(candidate, baseline, queries, k=4):
+    """
+    Measure how many of the exact top-k neighbours an approximate store returns.
+
+    Both stores must index the same documents under the same docstore IDs, e.g.
+    a flat and an HNSW store built by build_vectorstore with identical inputs.
+    Returns recall@k averaged over queries and per-query search latency.
+    """
+    embed_query = candidate.embedding_function.embed_query
+    query_vectors = np.asarray([embed_query(query) for query in queries], dtype=np.float32)
+    expected = _search_ids(baseline, query_vectors, k)
+    start = time.perf_counter()
+    found = _search_ids(candidate, query_vectors, k)
+    elapsed = time.perf_counter() - start
+    hits = sum(len(e & f) for e, f in zip(expected, found))
+    total = sum(len(e) for e in expected) or 1
+    return {"k": k, "queries": len(query_vectors), "recall": hits / total,
+            "seconds_per_query": elapsed / max(1, len(query_vectors))}
+
+
+if __name__ == "__main__":
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    from census_store import CENSUS_DIR, CHUNK_OVERLAP, CHUNK_SIZE, load_census_pdfs
+    from embedding_cache import get_embeddings
+
+    parser = argparse.ArgumentParser(description="Compare an approximate census index against the flat baseline.")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="hnsw")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=100, help="Number of chunks sampled as queries")
+    parser.add_argument("--nprobe", type=int, default=IVF_NPROBE)
+    parser.add_argument("--ef-search", type=int, default=HNSW_EF_SEARCH)
+    args = parser.parse_args()
+
+    documents = load_census_pdfs(CENSUS_DIR)
+    chunks = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP).split_documents(documents)
+    embeddings = get_embeddings()
+    ids = [str(i) for i in range(len(chunks))]
+
+    baseline = build_vectorstore(chunks, embeddings, index_type="flat", ids=ids)
+    candidate = build_vectorstore(chunks, embeddings, index_type=args.index_type, ids=ids,
+                                  nprobe=args.nprobe, ef_search=args.ef_search)
+
+    queries = [chunk.page_content for chunk in random.Random(0).sample(chunks, min(args.queries, len(chunks)))]
+    report = recall_at_k(candidate, baseline, queries, k=args.k)
+    print(f"{args.index_type}: recall@{args.k} = {report['recall']:.3f} over {report['queries']} queries, "
+          f"{report['seconds_per_query'] * 1000:.3f} ms/query")
+    print(f"Index memory: flat {index_memory_bytes(baseline)} bytes, "
+          f"{args.index_type} {index_memory_bytes(candidate)} bytes")
@@ -0,0 +1,113 @@
+import time
+from itertools import islice
+
+from index_factory import TRAIN_SAMPLE_SIZE, VECTOR_INDEX_TYPE, build_vectorstore, build_vectorstore_from_vectors
+from instrumentation import record
+
+# Chunks embedded and appended to the index per step
+INGEST_BATCH_SIZE = 256
+
+# Index types that must be trained before anything can be added to them
+TRAINED_INDEX_TYPES = ("ivf_flat", "ivf_pq")
+
+
+def batched(iterable, size):
+    """Yield lists of up to `size` items from `iterable`."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def timed(iterable, stage):
+    """Pass items through, recording the time spent producing them as `stage`."""
+    iterator = iter(iterable)
+    elapsed = 0.0
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            elapsed += time.perf_counter() - start
+            break
+        elapsed += time.perf_counter() - start
+        yield item
+    record(stage, elapsed)
+
+
+def iter_chunks(documents, text_splitter):
+    """Split documents one at a time, so only the current page's chunks are in memory."""
+    elapsed = 0.0
+    for doc in documents:
+        start = time.perf_counter()
+        chunks = text_splitter.split_documents([doc])
+        elapsed += time.perf_counter() - start
+        yield from chunks
+    record("split", elapsed)
+
+
+def ingest_documents(documents, embeddings, text_splitter, vectorstore=None, chunk_id=None,
+                     deduplicator=None, batch_size=INGEST_BATCH_SIZE, index_type=VECTOR_INDEX_TYPE,
+                     **index_params):
+    """
+    Stream documents through split -> embed -> index in fixed-size batches.
+
+    `documents` can be any iterable, typically a lazy loader, so peak memory is
+    bounded by one batch of chunks plus the index itself rather than by the
+    corpus size. A new index is created from the first batch if `vectorstore`
+    is None. IVF indexes are the exception: embedded batches are held back
+    until `train_sample_size` vectors (or the whole corpus, if smaller) are
+    available to train on, and then added in one go.
+
+    Args:
+        documents (iterable): Pages or web documents to index.
+        embeddings (Embeddings): Embedding model.
+        text_splitter (TextSplitter): Splitter applied to each document.
+        vectorstore (FAISS): Existing store to append to, or None.
+        chunk_id (callable): Optional function mapping a chunk to its docstore ID.
+        deduplicator (ChunkDeduplicator): Optional filter dropping duplicate chunks before embedding.
+        batch_size (int): Chunks embedded per batch.
+        index_type (str): Index type for a newly created store.
+        **index_params: Passed to index_factory.build_vectorstore.
+
+    Returns:
+        The vector store (None if there was nothing to index).
+    """
+    chunks = iter_chunks(timed(documents, "load"), text_splitter)
+    if deduplicator is not None:
+        chunks = deduplicator.filter(chunks)
+    train_sample_size = index_params.get("train_sample_size", TRAIN_SAMPLE_SIZE)
+    training = [] if vectorstore is None and index_type in TRAINED_INDEX_TYPES else None
+    training_size = 0
+
+    def build_from_training():
+        texts = [chunk.page_content for batch, _, _ in training for chunk in batch]
+        metadatas = [chunk.metadata for batch, _, _ in training for chunk in batch]
+        vectors = [vector for _, _, batch_vectors in training for vector in batch_vectors]
+        ids = [i for _, batch_ids, _ in training for i in batch_ids] if chunk_id else None
+        return build_vectorstore_from_vectors(texts, vectors, metadatas, embeddings, index_type=index_type, ids=ids,
+                                              **index_params)
+
+    for batch in batched(chunks, batch_size):
+        ids = [chunk_id(chunk) for chunk in batch] if chunk_id else None
+        start = time.perf_counter()
+        if vectorstore is not None:
+            vectorstore.add_documents(batch, ids=ids)
+        elif training is None:
+            vectorstore = build_vectorstore(batch, embeddings, index_type=index_type, ids=ids, **index_params)
+        else:
+            # Hold embedded batches back until there are enough vectors to train the IVF quantizers
+            training.append((batch, ids, embeddings.embed_documents([chunk.page_content for chunk in batch])))
+            training_size += len(batch)
+            if training_size >= train_sample_size:
+                vectorstore = build_from_training()
+        record("embed", time.perf_counter() - start)
+    if vectorstore is None and training:
+        start = time.perf_counter()
+        vectorstore = build_from_training()
+        record("embed", time.perf_counter() - start)
+    if deduplicator is not None:
+        deduplicator.merge_metadata(vectorstore)
+    return vectorstore
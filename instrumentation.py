@@ -0,0 +1,208 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Pipeline stages every RAG entry point reports, plus end-to-end request timings
+STAGES = ("load", "split", "embed", "retrieve", "prompt_build", "llm_first_token", "llm_complete",
+          "request_first_token", "request_total")
+
+# Where export_metrics() writes the latency summary by default
+METRICS_PATH = "./metrics/latency.json"
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class LatencyRecorder:
+    """
+    Thread-safe collection of wall-clock durations per pipeline stage.
+
+    The most recent `max_samples` durations of each stage are kept for
+    percentiles; bucket counts and totals cover every sample ever recorded.
+    """
+
+    def __init__(self, max_samples=10000):
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._buckets = {}
+        self._counts = {}
+        self._totals = {}
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self._samples.setdefault(stage, deque(maxlen=self.max_samples)).append(seconds)
+            buckets = self._buckets.setdefault(stage, [0] * (len(BUCKETS) + 1))
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+                    break
+            else:
+                buckets[-1] += 1
+            self._counts[stage] = self._counts.get(stage, 0) + 1
+            self._totals[stage] = self._totals.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def summary(self):
+        with self._lock:
+            result = {}
+            for stage, samples in self._samples.items():
+                values = sorted(samples)
+                bounds = [str(b) for b in BUCKETS] + ["+Inf"]
+                result[stage] = {
+                    "count": self._counts[stage],
+                    "mean": self._totals[stage] / self._counts[stage],
+                    "p50": percentile(values, 50),
+                    "p95": percentile(values, 95),
+                    "p99": percentile(values, 99),
+                    "max": values[-1],
+                    "histogram": dict(zip(bounds, self._buckets[stage])),
+                }
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._buckets.clear()
+            self._counts.clear()
+            self._totals.clear()
+
+
+# Process-wide recorder shared by all pipelines
+recorder = LatencyRecorder()
+
+
+def span(stage):
+    """Context manager timing the enclosed block as one sample of `stage`."""
+    return recorder.span(stage)
+
+
+def record(stage, seconds):
+    recorder.record(stage, seconds)
+
+
+def summary():
+    return recorder.summary()
+
+
+def export_metrics(path=METRICS_PATH):
+    """Write the current latency summary to a JSON file, replacing it atomically."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    payload = {"generated_at": time.time(), "stages": summary()}
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = json.dumps({"generated_at": time.time(), "stages": summary()}, indent=2).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def serve_metrics(port=None, host="127.0.0.1"):
+    """
+    Serve the latency summary as JSON on http://host:port/ from a daemon thread.
+
+    `port` defaults to the METRICS_PORT environment variable; nothing is started
+    if neither is set. Safe to call on every Streamlit rerun: the server is only
+    started once per process.
+    """
+    global _server
+    port = port or os.getenv("METRICS_PORT")
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+        return _server
+
+
+class LatencyCallbackHandler(BaseCallbackHandler):
+    """
+    LangChain callback handler recording retrieve, prompt_build,
+    llm_first_token and llm_complete spans for any chain it is attached to.
+    """
+
+    def __init__(self, recorder=recorder):
+        self.recorder = recorder
+        self._starts = {}
+        self._first_token_seen = set()
+
+    def _start(self, run_id):
+        self._starts[run_id] = time.perf_counter()
+
+    def _finish(self, run_id, stage):
+        start = self._starts.pop(run_id, None)
+        if start is not None:
+            self.recorder.record(stage, time.perf_counter() - start)
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._finish(run_id, "retrieve")
+
+    def on_chain_start(self, serialized, inputs, *, run_id, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name", "")
+        if name.endswith("PromptTemplate"):
+            self._start(run_id)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._finish(run_id, "prompt_build")
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        if run_id not in self._first_token_seen and run_id in self._starts:
+            self._first_token_seen.add(run_id)
+            self.recorder.record("llm_first_token", time.perf_counter() - self._starts[run_id])
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._first_token_seen.discard(run_id)
+        self._finish(run_id, "llm_complete")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._first_token_seen.discard(run_id)
+        self._starts.pop(run_id, None)
@@ -0,0 +1,458 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from embedding_cache import is_rate_limit_error
+from instrumentation import percentile
+
+# Comma-separated "provider:model" backends, best first; unset to use Groq with the app's own model
+LLM_ROUTER_MODELS = os.getenv("LLM_ROUTER_MODELS", "")
+
+# Give up on a request (all backends, fallbacks included) after this long
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "30"))
+
+# Start a second backend if the first hasn't answered after this long (before there is latency history)
+LLM_HEDGE_AFTER_SECONDS = float(os.getenv("LLM_HEDGE_AFTER_SECONDS", "4"))
+
+# Calls remembered per backend for its latency and error rate
+STATS_WINDOW = 50
+
+# Consecutive failures after which a backend is skipped for COOLDOWN_SECONDS
+MAX_CONSECUTIVE_FAILURES = 3
+COOLDOWN_SECONDS = 30.0
+
+# Hedged and abandoned calls keep running here after the router has moved on
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-router")
+
+
+class ProviderStats:
+    """Rolling latency and error rate of one backend, with a simple circuit breaker."""
+
+    def __init__(self, window=STATS_WINDOW):
+        self._calls = deque(maxlen=window)  # (latency_seconds, ok)
+        self._lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+    def record(self, latency, ok, rate_limited=False):
+        with self._lock:
+            self._calls.append((latency, ok))
+            if ok:
+                self.consecutive_failures = 0
+                return
+            self.consecutive_failures += 1
+            # Throttling won't clear on the next call, so back off straight away
+            if rate_limited or self.consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
+                self.open_until = time.monotonic() + COOLDOWN_SECONDS
+
+    def healthy(self):
+        return time.monotonic() >= self.open_until
+
+    def latency(self, q=50):
+        """Percentile of successful call latencies, or None before the first success."""
+        with self._lock:
+            latencies = sorted(latency for latency, ok in self._calls if ok)
+        return percentile(latencies, q)
+
+    def error_rate(self):
+        with self._lock:
+            if not self._calls:
+                return 0.0
+            return sum(not ok for _, ok in self._calls) / len(self._calls)
+
+    def score(self, failure_latency=LLM_DEADLINE_SECONDS):
+        """
+        Lower is better. Untried backends score 0 so they get explored; backends that
+        have only failed are scored as if they had taken `failure_latency`.
+        """
+        latency = self.latency()
+        if latency is None:
+            latency = failure_latency if self.error_rate() > 0 else 0.0
+        return latency * (1 + 4 * self.error_rate())
+
+    def snapshot(self):
+        return {"p50": self.latency(50), "p95": self.latency(95), "error_rate": self.error_rate(),
+                "calls": len(self._calls), "healthy": self.healthy()}
+
+
+# Shared by every router in the process, so Streamlit reruns don't forget what they learned
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def provider_stats(name):
+    with _stats_lock:
+        if name not in _stats:
+            _stats[name] = ProviderStats()
+        return _stats[name]
+
+
+def router_stats():
+    """Latency and health of every backend that has been used, by name."""
+    with _stats_lock:
+        return {name: stats.snapshot() for name, stats in _stats.items()}
+
+
+class LatencyRouter(BaseChatModel):
+    """
+    Chat model that routes each request to the fastest healthy backend.
+
+    Backends are ranked by rolling p50 latency, penalised by error rate, and
+    skipped for a cooldown after repeated failures or rate limiting. If the
+    chosen backend hasn't answered after its p95 latency (LLM_HEDGE_AFTER_SECONDS
+    before there is history), the request is hedged to the next backend and
+    the first answer wins. Failures fall back to the next backend until the
+    request's deadline, which can be overridden per call:
+    `router.invoke(messages, deadline=5)`.
+
+    `names` identify the backends in the shared statistics. Any chat model or
+    runnable works as a backend, including local fake chat models.
+    """
+
+    models: List[Any]
+    names: List[str]
+    deadline_seconds: float = LLM_DEADLINE_SECONDS
+    hedge_after_seconds: Optional[float] = None
+
+    @property
+    def _llm_type(self):
+        return "latency-router"
+
+    def _stats(self, i):
+        return provider_stats(self.names[i])
+
+    def ranked(self):
+        """Backend indices, best first; backends in cooldown go last rather than being dropped."""
+        order = sorted(range(len(self.models)), key=lambda i: self._stats(i).score(self.deadline_seconds))
+        return [i for i in order if self._stats(i).healthy()] + [i for i in order if not self._stats(i).healthy()]
+
+    def hedge_delay(self, i):
+        if self.hedge_after_seconds is not None:
+            return self.hedge_after_seconds
+        return self._stats(i).latency(95) or LLM_HEDGE_AFTER_SECONDS
+
+    def _record(self, i, started, error=None):
+        self._stats(i).record(time.monotonic() - started, ok=error is None,
+                              rate_limited=error is not None and is_rate_limit_error(error))
+
+    def _invoke_backend(self, i, messages, stop, kwargs):
+        started = time.monotonic()
+        try:
+            message = self.models[i].invoke(messages, stop=stop, **kwargs)
+        except Exception as e:
+            self._record(i, started, e)
+            raise
+        self._record(i, started)
+        return message
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        deadline = time.monotonic() + kwargs.pop("deadline", self.deadline_seconds)
+        candidates = self.ranked()
+        pending = {}
+        errors = []
+        hedge_at = None
+
+        def launch():
+            nonlocal hedge_at
+            i = candidates.pop(0)
+            pending[_executor.submit(self._invoke_backend, i, messages, stop, kwargs)] = i
+            hedge_at = time.monotonic() + self.hedge_delay(i)
+
+        launch()
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            can_hedge = candidates and len(pending) == 1
+            timeout = min(deadline, hedge_at) - now if can_hedge else deadline - now
+            done, _ = wait(pending, timeout=max(0.0, timeout), return_when=FIRST_COMPLETED)
+            for future in done:
+                i = pending.pop(future)
+                try:
+                    return ChatResult(generations=[ChatGeneration(message=future.result())])
+                except Exception as e:
+                    errors.append(f"{self.names[i]}: {e}")
+            if candidates and (not pending or (can_hedge and time.monotonic() >= hedge_at)):
+                launch()  # Fall back after a failure, or hedge a slow call
+        raise self._failure(errors, deadline)
+
+    async def _ainvoke_backend(self, i, messages, stop, kwargs):
+        started = time.monotonic()
+        try:
+            message = await self.models[i].ainvoke(messages, stop=stop, **kwargs)
+        except asyncio.CancelledError:
+            # Lost a hedge race: it took at least this long, which still counts against it
+            self._record(i, started)
+            raise
+        except Exception as e:
+            self._record(i, started, e)
+            raise
+        self._record(i, started)
+        return message
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        deadline = time.monotonic() + kwargs.pop("deadline", self.deadline_seconds)
+        candidates = self.ranked()
+        pending = {}
+        errors = []
+        hedge_at = None
+
+        def launch():
+            nonlocal hedge_at
+            i = candidates.pop(0)
+            pending[asyncio.ensure_future(self._ainvoke_backend(i, messages, stop, kwargs))] = i
+            hedge_at = time.monotonic() + self.hedge_delay(i)
+
+        launch()
+        try:
+            while pending:
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                can_hedge = candidates and len(pending) == 1
+                timeout = min(deadline, hedge_at) - now if can_hedge else deadline - now
+                done, _ = await asyncio.wait(pending, timeout=max(0.0, timeout), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    i = pending.pop(task)
+                    try:
+                        return ChatResult(generations=[ChatGeneration(message=task.result())])
+                    except Exception as e:
+                        errors.append(f"{self.names[i]}: {e}")
+                if candidates and (not pending or (can_hedge and time.monotonic() >= hedge_at)):
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise self._failure(errors, deadline)
+
+    def _failure(self, errors, deadline):
+        if time.monotonic() >= deadline:
+            return TimeoutError(f"No LLM backend answered before the deadline. Errors: {errors or 'none'}")
+        return RuntimeError(f"All LLM backends failed: {errors}")
+
+    def _start_stream(self, i, messages, stop, kwargs, events):
+        """Read backend i's stream on its own thread into `events`; returns the event that abandons it."""
+        cancelled = threading.Event()
+        threading.Thread(target=self._pump_stream, args=(i, messages, stop, kwargs, events, cancelled),
+                         name=f"llm-router-stream-{i}", daemon=True).start()
+        return cancelled
+
+    def _pump_stream(self, i, messages, stop, kwargs, events, cancelled):
+        started = time.monotonic()
+        stream = None
+        try:
+            stream = iter(self.models[i].stream(messages, stop=stop, **kwargs))
+            for chunk in stream:
+                if cancelled.is_set():
+                    break
+                events.put((i, "chunk", chunk))
+        except Exception as e:
+            self._record(i, started, e)
+            events.put((i, "error", e))
+            return
+        finally:
+            if hasattr(stream, "close"):
+                stream.close()
+        self._record(i, started)
+        events.put((i, "end", None))
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        # Each backend stream is read on a thread so a stall can't block the request. If no token has
+        # arrived after the hedge delay, the next backend is started too and the first one to produce a
+        # token wins; the others are abandoned. After the first token there is no fallback, since the
+        # output can't be duplicated, and a gap longer than the deadline between tokens counts as a stall.
+        deadline = time.monotonic() + kwargs.pop("deadline", self.deadline_seconds)
+        candidates = self.ranked()
+        events = queue.Queue()
+        running = {}
+        errors = []
+        hedge_at = None
+
+        def launch():
+            nonlocal hedge_at
+            i = candidates.pop(0)
+            running[i] = self._start_stream(i, messages, stop, kwargs, events)
+            hedge_at = time.monotonic() + self.hedge_delay(i)
+
+        launch()
+        winner = None
+        try:
+            while winner is None and running:
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                timeout = min(deadline, hedge_at) - now if candidates else deadline - now
+                try:
+                    i, kind, payload = events.get(timeout=max(0.0, timeout))
+                except queue.Empty:
+                    if candidates and time.monotonic() >= hedge_at:
+                        launch()  # No first token yet: hedge to the next backend
+                    continue
+                if i not in running:
+                    continue
+                if kind == "error":
+                    del running[i]
+                    errors.append(f"{self.names[i]}: {payload}")
+                    if candidates and not running:
+                        launch()  # Fall back
+                    continue
+                winner = i
+            if winner is None:
+                raise self._failure(errors, deadline)
+            for i, cancelled in running.items():
+                if i != winner:
+                    cancelled.set()
+
+            while kind == "chunk":
+                chunk = ChatGenerationChunk(message=payload)
+                if run_manager:
+                    run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+                while True:
+                    try:
+                        i, kind, payload = events.get(timeout=self.deadline_seconds)
+                    except queue.Empty:
+                        raise TimeoutError(f"LLM backend {self.names[winner]} stalled mid-stream")
+                    if i == winner:
+                        break
+            if kind == "error":
+                raise payload
+        finally:
+            for cancelled in running.values():
+                cancelled.set()
+
+    async def _apump_stream(self, i, messages, stop, kwargs, events):
+        started = time.monotonic()
+        try:
+            async for chunk in self.models[i].astream(messages, stop=stop, **kwargs):
+                events.put_nowait((i, "chunk", chunk))
+        except asyncio.CancelledError:
+            # Lost the race or abandoned by the caller: it took at least this long
+            self._record(i, started)
+            raise
+        except Exception as e:
+            self._record(i, started, e)
+            events.put_nowait((i, "error", e))
+            return
+        self._record(i, started)
+        events.put_nowait((i, "end", None))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        # Same hedging as _stream, with one task per backend stream; losers are cancelled
+        deadline = time.monotonic() + kwargs.pop("deadline", self.deadline_seconds)
+        candidates = self.ranked()
+        events = asyncio.Queue()
+        running = {}
+        errors = []
+        hedge_at = None
+
+        def launch():
+            nonlocal hedge_at
+            i = candidates.pop(0)
+            running[i] = asyncio.ensure_future(self._apump_stream(i, messages, stop, kwargs, events))
+            hedge_at = time.monotonic() + self.hedge_delay(i)
+
+        launch()
+        winner = None
+        try:
+            while winner is None and running:
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                timeout = min(deadline, hedge_at) - now if candidates else deadline - now
+                try:
+                    i, kind, payload = await asyncio.wait_for(events.get(), timeout=max(0.0, timeout))
+                except asyncio.TimeoutError:
+                    if candidates and time.monotonic() >= hedge_at:
+                        launch()
+                    continue
+                if i not in running:
+                    continue
+                if kind == "error":
+                    del running[i]
+                    errors.append(f"{self.names[i]}: {payload}")
+                    if candidates and not running:
+                        launch()
+                    continue
+                winner = i
+            if winner is None:
+                raise self._failure(errors, deadline)
+            for i, task in running.items():
+                if i != winner:
+                    task.cancel()
+
+            while kind == "chunk":
+                chunk = ChatGenerationChunk(message=payload)
+                if run_manager:
+                    await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+                while True:
+                    try:
+                        i, kind, payload = await asyncio.wait_for(events.get(), timeout=self.deadline_seconds)
+                    except asyncio.TimeoutError:
+                        raise TimeoutError(f"LLM backend {self.names[winner]} stalled mid-stream")
+                    if i == winner:
+                        break
+            if kind == "error":
+                raise payload
+        finally:
+            for task in running.values():
+                task.cancel()
+
+    def bind_tools(self, tools, **kwargs):
+        """Router over the backends that support tool calling, sharing this router's statistics."""
+        models, names = [], []
+        for model, name in zip(self.models, self.names):
+            try:
+                models.append(model.bind_tools(tools, **kwargs))
+                names.append(name)
+            except NotImplementedError:
+                continue
+        if not models:
+            raise NotImplementedError("None of the router's backends support tool calling")
+        return LatencyRouter(models=models, names=names, deadline_seconds=self.deadline_seconds,
+                             hedge_after_seconds=self.hedge_after_seconds)
+
+
+def make_backend(spec):
+    """
+    Build a chat model from a "provider:model" spec. Supported providers are
+    groq (GROQ_API_KEY) and azure (AZURE_OPENAI_* settings; the model is the deployment name).
+    """
+    provider, _, model = spec.partition(":")
+    if provider == "groq":
+        from langchain_groq import ChatGroq
+
+        return ChatGroq(groq_api_key=os.getenv("GROQ_API_KEY"), model_name=model)
+    if provider == "azure":
+        from langchain_openai import AzureChatOpenAI
+
+        return AzureChatOpenAI(deployment_name=model, api_version="2024-05-01-preview", temperature=0.7)
+    raise ValueError(f"Unknown LLM provider {provider!r} in {spec!r}")
+
+
+def get_chat_model(default_model, specs=None):
+    """
+    Router over the backends in `specs` (default: LLM_ROUTER_MODELS), or over
+    Groq's `default_model` alone when none are configured. Backends whose
+    client can't be created (missing package or key) are skipped with a warning.
+    """
+    specs = specs or [s.strip() for s in LLM_ROUTER_MODELS.split(",") if s.strip()] or [f"groq:{default_model}"]
+    models, names = [], []
+    for spec in specs:
+        try:
+            models.append(make_backend(spec))
+            names.append(spec)
+        except Exception as e:
+            print(f"Skipping LLM backend {spec}: {e}")
+    if not models:
+        raise RuntimeError(f"No LLM backend could be created from {specs}")
+    return LatencyRouter(models=models, names=names)
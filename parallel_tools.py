@@ -0,0 +1,64 @@
+import asyncio
+import os
+
+from langchain_core.messages import ToolMessage
+
+# Upper bound on a single tool call; a slow Wikipedia/Arxiv/census lookup should not stall the turn
+TOOL_TIMEOUT_SECONDS = float(os.getenv("TOOL_TIMEOUT_SECONDS", "20"))
+
+# Run the graphs with concurrent tool execution (set AGENT_ASYNC=0 for the sequential ToolNode)
+AGENT_ASYNC = os.getenv("AGENT_ASYNC", "1") == "1"
+
+
+def make_parallel_tool_node(tools, timeout=TOOL_TIMEOUT_SECONDS):
+    """
+    Build an async LangGraph node that runs all tool calls of the last
+    assistant message concurrently.
+
+    Each call gets its own `timeout`; a call that times out or raises produces
+    an error ToolMessage instead of failing the turn. Results are returned in
+    the order the model issued the calls, so a turn costs roughly the slowest
+    tool's latency rather than the sum of all of them.
+    """
+    tools_by_name = {tool.name: tool for tool in tools}
+
+    async def run_call(call):
+        tool = tools_by_name.get(call["name"])
+        if tool is None:
+            content = f"Error: unknown tool '{call['name']}'"
+        else:
+            try:
+                # Synchronous tools are run on the default executor by ainvoke
+                content = await asyncio.wait_for(tool.ainvoke(call["args"]), timeout)
+            except asyncio.TimeoutError:
+                content = f"Error: tool '{call['name']}' timed out after {timeout:.0f}s"
+            except Exception as e:
+                content = f"Error: tool '{call['name']}' failed: {e}"
+        return ToolMessage(content=str(content), name=call["name"], tool_call_id=call["id"])
+
+    async def tool_node(state):
+        message = state["messages"][-1]
+        results = await asyncio.gather(*(run_call(call) for call in getattr(message, "tool_calls", [])))
+        return {"messages": list(results)}
+
+    return tool_node
+
+
+def print_graph_events(graph, inputs, config=None, use_async=AGENT_ASYNC):
+    """Stream a compiled graph and pretty-print each new message, synchronously or on an event loop."""
+    def print_event(event):
+        try:
+            event["messages"][-1].pretty_print()
+        except Exception as e:
+            print(f"Error processing event: {e}")
+
+    if not use_async:
+        for event in graph.stream(inputs, config=config, stream_mode="values"):
+            print_event(event)
+        return
+
+    async def run():
+        async for event in graph.astream(inputs, config=config, stream_mode="values"):
+            print_event(event)
+
+    asyncio.run(run())
@@ -0,0 +1,68 @@
+import time
+
+from instrumentation import LatencyCallbackHandler, record
+
+
+class StreamedAnswer:
+    """
+    Streams a `create_retrieval_chain` response.
+
+    Iterating `tokens()` drives the chain: the retrieved documents are handed to
+    `on_context` as soon as retrieval finishes, and answer tokens are yielded as
+    the LLM produces them. Time-to-first-token and total latency are measured
+    with a wall clock from the moment the stream is started, and every pipeline
+    stage is reported to the shared latency recorder.
+
+    Setting `cancel_event` (a threading.Event) stops the stream at the next
+    chunk and closes the underlying chain, so the LLM stops generating.
+    """
+
+    def __init__(self, retrieval_chain, inputs, on_context=None, cancel_event=None):
+        self.retrieval_chain = retrieval_chain
+        self.inputs = inputs
+        self.on_context = on_context
+        self.cancel_event = cancel_event
+        self.cancelled = False
+        self.context = []
+        self.answer = ""
+        self.started_at = None
+        self.first_token_at = None
+        self.finished_at = None
+
+    def tokens(self):
+        self.started_at = time.perf_counter()
+        config = {"callbacks": [LatencyCallbackHandler()]}
+        stream = self.retrieval_chain.stream(self.inputs, config=config)
+        try:
+            for chunk in stream:
+                if self.cancel_event is not None and self.cancel_event.is_set():
+                    self.cancelled = True
+                    break
+                if "context" in chunk:
+                    self.context = chunk["context"]
+                    if self.on_context:
+                        self.on_context(self.context)
+                token = chunk.get("answer")
+                if token:
+                    if self.first_token_at is None:
+                        self.first_token_at = time.perf_counter()
+                        record("request_first_token", self.first_token_at - self.started_at)
+                    self.answer += token
+                    yield token
+        finally:
+            stream.close()  # Also runs when the consumer abandons this generator
+        self.finished_at = time.perf_counter()
+        record("request_total", self.finished_at - self.started_at)
+
+    @property
+    def time_to_first_token(self):
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+    @property
+    def total_latency(self):
+        if self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
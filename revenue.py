@@ -1,36 +1,24 @@
-import win32com.client
 import os
-import re
 
-def sanitize_sheet_name(name, flash_code):
-    """Sanitizes a sheet name for Excel and makes it unique with flash_code."""
-    base_name = str(name) if name else "Report"
-    # Replace forbidden characters: \ / ? * [ ] :
-    # Excel sheet names cannot contain: \ / ? * [ ]
-    # Also, ':' is problematic for file systems if sheet name is used in filenames later.
-    # Max length is 31 characters.
-    sanitized_base_name = re.sub(r'[\\/\?\*\[\]:]', '_', base_name)
+from revenue_engine import BACKENDS, REVENUE_BACKEND, generate_report, sanitize_sheet_name
+from revenue_ref import collect_flash_codes, load_division_index, load_division_index_com
 
-    # Construct name with flash_code, ensuring it's not too long
-    suffix = f"_{flash_code}"
-    max_base_len = 31 - len(suffix)
-
-    if len(sanitized_base_name) > max_base_len:
-        sanitized_base_name = sanitized_base_name[:max_base_len]
-
-    final_name = f"{sanitized_base_name}{suffix}"
-    return final_name[:31] # Ensure final length is max 31
-
-def automate_revenue_report(source_workbook_path, division_input, macro_names_to_run):
+def automate_revenue_report(source_workbook_path, division_input, macro_names_to_run, division_index=None,
+                            backend=REVENUE_BACKEND):
     """
     Automates the Excel report generation process.
 
     Args:
         source_workbook_path (str): Full path to the source Excel workbook.
-        division_input (str): The division to process (e.g., "APAC").
+        division_input (str or list): The division to process (e.g., "APAC"), or several divisions
+                                      whose flash codes all go into the same new workbook.
         macro_names_to_run (list): A list of macro names (strings) to run.
                                    Example: ["Macro1", "Sheet1.ProcessData"]
                                    Macros should be in the source workbook.
+        division_index (DivisionIndex): Optional Ref sheet index from an earlier run
+                                        (see revenue_ref.py); read from the workbook if omitted.
+        backend (str): "openpyxl" renders the sheets without Excel, in parallel (see revenue_engine.py);
+                       "com" drives Excel and also runs the macros and RefreshAll.
     """
     excel_app = None
     source_wb = None
@@ -42,7 +30,30 @@ def automate_revenue_report(source_workbook_path, division_input, macro_names_to
             print(f"Error: Source workbook not found at {source_workbook_path}")
             return
 
+        # Define the path for the new workbook
+        output_folder = os.path.dirname(source_workbook_path) if os.path.dirname(source_workbook_path) else os.getcwd()
+        new_workbook_save_path = os.path.join(output_folder, "sample.xlsx")
+
+        if backend not in BACKENDS:
+            print(f"Error: Unknown backend '{backend}', expected one of {BACKENDS}.")
+            return
+
+        # --- Headless backend: Template rendered per flash code in a process pool, no Excel needed ---
+        if backend == "openpyxl":
+            if division_index is None:
+                division_index = load_division_index(source_workbook_path)
+            flash_codes = collect_flash_codes(division_index, division_input)
+            if not flash_codes:
+                print(f"No flash codes to process for division(s) {division_input}.")
+                return
+            print(f"Found flash codes: {flash_codes}")
+            generate_report(source_workbook_path, flash_codes, new_workbook_save_path, name_cell="E5",
+                            macro_names_to_run=macro_names_to_run)
+            return
+
         # --- 1. Initialization ---
+        import win32com.client  # Windows only; needed by the COM backend alone
+
         print("Initializing Excel application...")
         excel_app = win32com.client.Dispatch("Excel.Application")
         excel_app.Visible = False  # Run in background; set to True for debugging
@@ -53,9 +64,6 @@ def automate_revenue_report(source_workbook_path, division_input, macro_names_to
 
         print("Creating new workbook 'sample.xlsx'...")
         new_wb = excel_app.Workbooks.Add()
-        # Define the path for the new workbook
-        output_folder = os.path.dirname(source_workbook_path) if os.path.dirname(source_workbook_path) else os.getcwd()
-        new_workbook_save_path = os.path.join(output_folder, "sample.xlsx")
 
 
         # --- 2. Access Sheets in Source Workbook ---
@@ -72,44 +80,19 @@ def automate_revenue_report(source_workbook_path, division_input, macro_names_to
             return
 
         # --- 3. Retrieve Flash Codes for the Division (Lookup Method) ---
-        print(f"Retrieving flash codes for division: {division_input} from 'Ref' sheet...")
-        flash_codes = []
-        # Assuming 'Ref' sheet has headers in row 1. Data starts from row 2.
-        # Column A (index 1) for Division, B (2), C (3), D (4) for Flash Codes.
-        # UsedRange can be unreliable if sheet has stray data. Iterate a reasonable range or find last row.
-        # For simplicity, let's iterate up to a presumed max number of rows or use UsedRange carefully.
-        # A more robust way is to find the last used row in column A.
-        last_row_ref = source_ref_sheet.Cells(source_ref_sheet.Rows.Count, "A").End(-4162).Row # -4162 is xlUp
-
-        found_division = False
-        for r in range(1, last_row_ref + 1): # Iterate from row 1 (assuming headers might be there)
-            division_cell_value = source_ref_sheet.Cells(r, 1).Value
-            if division_cell_value and str(division_cell_value).strip() == division_input:
-                print(f"Found division '{division_input}' in 'Ref' sheet at row {r}.")
-                # Flash codes are in columns B, C, D (indices 2, 3, 4)
-                fc1 = source_ref_sheet.Cells(r, 2).Value
-                fc2 = source_ref_sheet.Cells(r, 3).Value
-                fc3 = source_ref_sheet.Cells(r, 4).Value
-
-                if fc1 and str(fc1).strip(): flash_codes.append(str(fc1).strip())
-                if fc2 and str(fc2).strip(): flash_codes.append(str(fc2).strip())
-                if fc3 and str(fc3).strip(): flash_codes.append(str(fc3).strip())
-                found_division = True
-                break # Stop searching once division is found
-
-        if not found_division:
-            print(f"Error: Division '{division_input}' not found in 'Ref' sheet (Column A).")
-            # Clean up before exiting
-            if source_wb: source_wb.Close(SaveChanges=False)
-            if new_wb: new_wb.Close(SaveChanges=False) # new_wb is empty, no need to save
-            excel_app.Quit()
-            return
+        print(f"Retrieving flash codes for division(s): {division_input} from 'Ref' sheet...")
+        # Column A for Division, B, C, D for Flash Codes. The whole sheet (down to the last used row in
+        # column A) comes back from Excel in one Range read instead of one COM call per cell, and the
+        # in-memory index is reused for every division
+        if division_index is None:
+            division_index = load_division_index_com(source_ref_sheet)
+        flash_codes = collect_flash_codes(division_index, division_input)
 
         if not flash_codes:
-            print(f"No flash codes found for division '{division_input}'.")
+            print(f"No flash codes to process for division(s) {division_input}.")
             # Clean up before exiting
             if source_wb: source_wb.Close(SaveChanges=False)
-            if new_wb: new_wb.Close(SaveChanges=False)
+            if new_wb: new_wb.Close(SaveChanges=False) # new_wb is empty, no need to save
             excel_app.Quit()
             return
 
@@ -240,16 +223,8 @@ def automate_revenue_report(source_workbook_path, division_input, macro_names_to
         source_ref_sheet = None
         source_wb = None
         new_wb = None
-    # For debugging, you can print all division names in Ref sheet:
-    # (Uncomment the following lines to see available division names)
-    # import win32com.client
-    # excel = win32com.client.Dispatch("Excel.Application")
-    # wb = excel.Workbooks.Open(SOURCE_WORKBOOK_FULL_PATH)
-    # ref_sheet = wb.Sheets("Ref")
-    # last_row = ref_sheet.Cells(ref_sheet.Rows.Count, "A").End(-4162).Row
-    # print([ref_sheet.Cells(r, 1).Value for r in range(1, last_row+1)])
-    # wb.Close(False)
-    # excel.Quit()
+    # For debugging, you can print all division names in Ref sheet (no Excel needed):
+    #   python revenue_ref.py "RevenueReport phase2.xlsm"
     print("Automation process finished.")
 
 if __name__ == "__main__":
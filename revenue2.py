@@ -1,27 +1,8 @@
-import win32com.client
 import os
-import re
 
-def sanitize_sheet_name(name, flash_code):
-    """Sanitizes a sheet name for Excel and makes it unique with flash_code."""
-    base_name = str(name) if name else "Report"
-    # Replace forbidden characters: \ / ? * [ ] :
-    # Excel sheet names cannot contain: \ / ? * [ ]
-    # Also, ':' is problematic for file systems if sheet name is used in filenames later.
-    # Max length is 31 characters.
-    sanitized_base_name = re.sub(r'[\\/\?\*\[\]:]', '_', base_name)
+from revenue_engine import BACKENDS, REVENUE_BACKEND, generate_report, sanitize_sheet_name
 
-    # Construct name with flash_code, ensuring it's not too long
-    suffix = f"_{flash_code}"
-    max_base_len = 31 - len(suffix)
-
-    if len(sanitized_base_name) > max_base_len:
-        sanitized_base_name = sanitized_base_name[:max_base_len]
-
-    final_name = f"{sanitized_base_name}{suffix}"
-    return final_name[:31] # Ensure final length is max 31
-
-def automate_revenue_report(source_workbook_path, flash_codes_to_process, macro_names_to_run):
+def automate_revenue_report(source_workbook_path, flash_codes_to_process, macro_names_to_run, backend=REVENUE_BACKEND):
     """
     Automates the Excel report generation process using a provided list of flash codes.
 
@@ -31,6 +12,8 @@ def automate_revenue_report(source_workbook_path, flash_codes_to_process, macro_
         macro_names_to_run (list): A list of macro names (strings) to run.
                                    Example: ["Macro1", "Sheet1.ProcessData"]
                                    Macros should be in the source workbook.
+        backend (str): "openpyxl" renders the sheets without Excel, in parallel (see revenue_engine.py);
+                       "com" drives Excel and also runs the macros and RefreshAll.
     """
     excel_app = None
     source_wb = None
@@ -42,7 +25,25 @@ def automate_revenue_report(source_workbook_path, flash_codes_to_process, macro_
             print(f"Error: Source workbook not found at {source_workbook_path}")
             return
 
+        if backend not in BACKENDS:
+            print(f"Error: Unknown backend '{backend}', expected one of {BACKENDS}.")
+            return
+
+        # --- Headless backend: Template rendered per flash code in a process pool, no Excel needed ---
+        if backend == "openpyxl":
+            if not flash_codes_to_process or not isinstance(flash_codes_to_process, list):
+                print("Error: No flash codes provided or the input is not a list.")
+                return
+            flash_codes = [str(code).strip() for code in flash_codes_to_process if code and str(code).strip()]
+            print(f"Processing provided flash codes: {flash_codes}")
+            output_folder = os.path.dirname(source_workbook_path) if os.path.dirname(source_workbook_path) else os.getcwd()
+            generate_report(source_workbook_path, flash_codes, os.path.join(output_folder, "sample.xlsx"),
+                            name_cell="B5", macro_names_to_run=macro_names_to_run)
+            return
+
         # --- 1. Initialization ---
+        import win32com.client  # Windows only; needed by the COM backend alone
+
         print("Initializing Excel application...")
         excel_app = win32com.client.Dispatch("Excel.Application")
         excel_app.Visible = False  # Run in background; set to True for debugging
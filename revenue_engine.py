@@ -0,0 +1,192 @@
+import argparse
+import math
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from revenue_ref import collect_flash_codes, load_division_index
+
+# "openpyxl" renders reports headless with a Python formula evaluator; "com" drives Excel (Windows only)
+REVENUE_BACKEND = os.getenv("REVENUE_BACKEND", "openpyxl")
+
+BACKENDS = ("openpyxl", "com")
+
+# Processes rendering flash codes in parallel; 0 picks one per CPU, but see MIN_FLASH_CODES_PER_WORKER
+REVENUE_WORKERS = int(os.getenv("REVENUE_WORKERS", "0"))
+
+# Every worker loads and compiles the workbook itself, which costs several renders' worth of time,
+# so with automatic sizing a worker is only started for at least this many flash codes
+MIN_FLASH_CODES_PER_WORKER = 4
+
+TEMPLATE_SHEET_NAME = "Template"
+
+# Cells on the Template sheet that receive the flash code
+FLASH_CODE_CELLS = ("E6", "E7", "E8")
+
+
+def sanitize_sheet_name(name, flash_code):
+    """Sanitizes a sheet name for Excel and makes it unique with flash_code."""
+    base_name = str(name) if name else "Report"
+    # Replace forbidden characters: \ / ? * [ ] :
+    # Excel sheet names cannot contain: \ / ? * [ ]
+    # Also, ':' is problematic for file systems if sheet name is used in filenames later.
+    # Max length is 31 characters.
+    sanitized_base_name = re.sub(r'[\\/\?\*\[\]:]', '_', base_name)
+
+    # Construct name with flash_code, ensuring it's not too long
+    suffix = f"_{flash_code}"
+    max_base_len = 31 - len(suffix)
+
+    if len(sanitized_base_name) > max_base_len:
+        sanitized_base_name = sanitized_base_name[:max_base_len]
+
+    final_name = f"{sanitized_base_name}{suffix}"
+    return final_name[:31] # Ensure final length is max 31
+
+
+class TemplateRenderer:
+    """
+    Computes the Template sheet for one flash code at a time, without Excel.
+
+    The workbook is loaded and compiled into a dependency graph once (pycel).
+    Rendering a flash code sets the input cells and re-evaluates only the
+    formulas that depend on them, instead of recalculating the whole workbook.
+    """
+
+    def __init__(self, workbook_path, template_sheet=TEMPLATE_SHEET_NAME, input_cells=FLASH_CODE_CELLS,
+                 name_cell="E5"):
+        try:
+            from pycel import ExcelCompiler
+        except ImportError as e:
+            raise ImportError("The openpyxl revenue backend needs pycel: pip install pycel") from e
+
+        self.compiler = ExcelCompiler(filename=workbook_path)
+        self.template_sheet = template_sheet
+        self.formula_cells = [address.coordinate for address in self.compiler.formula_cells(template_sheet)]
+        self.input_addresses = [f"{template_sheet}!{cell}" for cell in input_cells]
+        self.name_address = f"{template_sheet}!{name_cell}"
+        # Inputs must be in the dependency graph before set_value, even if no formula reads them
+        for address in self.input_addresses:
+            self.compiler.evaluate(address)
+
+    def render(self, flash_code):
+        """Returns (flash_code, sheet name base, {coordinate: value} for every formula cell)."""
+        for address in self.input_addresses:
+            self.compiler.set_value(address, flash_code)
+        values = {cell: self.compiler.evaluate(f"{self.template_sheet}!{cell}") for cell in self.formula_cells}
+        return flash_code, self.compiler.evaluate(self.name_address), values
+
+
+# Each pool worker loads the workbook once and renders many flash codes with it
+_worker_renderer = None
+
+
+def _init_worker(workbook_path, template_sheet, input_cells, name_cell):
+    global _worker_renderer
+    _worker_renderer = TemplateRenderer(workbook_path, template_sheet, input_cells, name_cell)
+
+
+def _render_in_worker(flash_code):
+    return _worker_renderer.render(flash_code)
+
+
+def render_flash_codes(workbook_path, flash_codes, max_workers=REVENUE_WORKERS, template_sheet=TEMPLATE_SHEET_NAME,
+                       input_cells=FLASH_CODE_CELLS, name_cell="E5"):
+    """Render every flash code, fanned out to a process pool; results are in flash code order."""
+    if not max_workers:
+        max_workers = min(os.cpu_count() or 1, math.ceil(len(flash_codes) / MIN_FLASH_CODES_PER_WORKER))
+    max_workers = min(max_workers, len(flash_codes))
+    args = (workbook_path, template_sheet, input_cells, name_cell)
+    if max_workers <= 1:
+        renderer = TemplateRenderer(*args)
+        return [renderer.render(flash_code) for flash_code in flash_codes]
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=args) as executor:
+        return list(executor.map(_render_in_worker, flash_codes))
+
+
+def assemble_workbook(workbook_path, rendered, output_path, template_sheet=TEMPLATE_SHEET_NAME,
+                      input_cells=FLASH_CODE_CELLS):
+    """
+    Write one copy of the Template sheet per rendered flash code to `output_path`.
+
+    Copies keep the Template's formatting, merged cells and column widths; formulas
+    are replaced by their computed values. As with the COM backend, each copy goes
+    in front of the previous ones and a repeated sheet name replaces the older sheet.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(workbook_path)
+    template = workbook[template_sheet]
+    source_sheets = list(workbook.worksheets)
+
+    latest = {}
+    for flash_code, name_base, values in rendered:
+        if not name_base:
+            print("  Warning: the sheet name cell in 'Template' is empty. Using 'Report' as base name.")
+        target_sheet_name = sanitize_sheet_name(name_base or "Report", flash_code)
+        latest.pop(target_sheet_name, None)
+        latest[target_sheet_name] = (flash_code, values)
+
+    copies = []
+    for target_sheet_name, (flash_code, values) in reversed(list(latest.items())):
+        sheet = workbook.copy_worksheet(template)
+        for cell in input_cells:
+            sheet[cell].value = flash_code
+        for cell, value in values.items():
+            sheet[cell].value = value
+        copies.append((sheet, target_sheet_name))
+
+    # Only the copies go into the output; names would point at the removed sheets
+    for sheet in source_sheets:
+        workbook.remove(sheet)
+    for name in list(workbook.defined_names):
+        del workbook.defined_names[name]
+    # Renamed only now, so a target name can't clash with a source sheet's
+    for sheet, target_sheet_name in copies:
+        sheet.title = target_sheet_name
+    workbook.save(output_path)
+    return list(latest)
+
+
+def generate_report(workbook_path, flash_codes, output_path, name_cell="E5", macro_names_to_run=None,
+                    max_workers=REVENUE_WORKERS):
+    """
+    Headless replacement for the COM report loop: render each flash code's Template
+    sheet in parallel and save them all to `output_path` (e.g. sample.xlsx).
+
+    Args:
+        workbook_path (str): Source workbook with the 'Template' sheet and the data it reads.
+        flash_codes (list): Flash codes to render, written to E6:E8 in turn.
+        output_path (str): Workbook to create.
+        name_cell (str): Template cell whose value names each copied sheet.
+        macro_names_to_run (list): VBA macros can't run without Excel; they are reported and skipped.
+        max_workers (int): Rendering processes; 0 for one per CPU.
+    """
+    if macro_names_to_run:
+        print(f"  Note: macros {macro_names_to_run} and RefreshAll need Excel (backend 'com'); skipping them.")
+    start = time.perf_counter()
+    rendered = render_flash_codes(workbook_path, flash_codes, max_workers=max_workers, name_cell=name_cell)
+    render_seconds = time.perf_counter() - start
+    sheet_names = assemble_workbook(workbook_path, rendered, output_path)
+    print(f"Rendered {len(rendered)} flash code(s) in {render_seconds:.2f} s, "
+          f"saved {len(sheet_names)} sheet(s) to '{output_path}' in {time.perf_counter() - start:.2f} s total.")
+    return sheet_names
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render revenue report sheets without Excel.")
+    parser.add_argument("workbook", help="Source workbook with 'Template' and 'Ref' sheets")
+    parser.add_argument("flash_codes", nargs="*", help="Flash codes to render (default: those of --division)")
+    parser.add_argument("--division", action="append", default=[], help="Division from the 'Ref' sheet; repeatable")
+    parser.add_argument("--output", default="sample.xlsx")
+    parser.add_argument("--name-cell", default="E5", help="Template cell naming each sheet (revenue2.py uses B5)")
+    parser.add_argument("--workers", type=int, default=REVENUE_WORKERS)
+    args = parser.parse_args()
+
+    flash_codes = list(args.flash_codes)
+    if args.division:
+        flash_codes += collect_flash_codes(load_division_index(args.workbook), args.division)
+    if not flash_codes:
+        parser.error("no flash codes given or found for the divisions")
+    generate_report(args.workbook, flash_codes, args.output, name_cell=args.name_cell, max_workers=args.workers)
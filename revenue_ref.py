@@ -0,0 +1,118 @@
+REF_SHEET_NAME = "Ref"
+
+# Columns A:D - division, then the flash codes
+REF_COLUMNS = 4
+
+XL_UP = -4162  # xlUp, for End()
+
+
+def _clean(value):
+    """Cell value as stripped text; whole-number floats (how COM returns numbers) lose their '.0'."""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+class DivisionIndex:
+    """
+    In-memory division -> flash codes index for the 'Ref' sheet.
+
+    The Ref sheet has one row per division: the division name in column A and
+    up to three flash codes in columns B, C and D. The rows are read in one go
+    (a single Range.Value call over COM, or one openpyxl pass), so looking up
+    any number of divisions costs no further reads from Excel.
+    """
+
+    def __init__(self, rows):
+        """
+        Args:
+            rows (iterable): Row value tuples starting at row 1, columns A:D.
+                             The first row listing a division wins.
+        """
+        self._codes = {}
+        self._rows = {}
+        for row_number, row in enumerate(rows, start=1):
+            if not row:
+                continue
+            division = _clean(row[0])
+            if not division or division in self._codes:
+                continue
+            self._codes[division] = [code for code in map(_clean, row[1:REF_COLUMNS]) if code]
+            self._rows[division] = row_number
+
+    def __contains__(self, division):
+        return division in self._codes
+
+    def __len__(self):
+        return len(self._codes)
+
+    def divisions(self):
+        return list(self._codes)
+
+    def row_of(self, division):
+        """Ref sheet row the division was found in, or None."""
+        return self._rows.get(division)
+
+    def flash_codes(self, division):
+        """Flash codes for `division` in column order, or None if the division isn't listed."""
+        codes = self._codes.get(division)
+        return list(codes) if codes is not None else None
+
+
+def read_ref_rows_com(ref_sheet):
+    """All Ref rows down to the last used cell in column A, in one COM round trip."""
+    last_row = ref_sheet.Cells(ref_sheet.Rows.Count, "A").End(XL_UP).Row
+    values = ref_sheet.Range(ref_sheet.Cells(1, 1), ref_sheet.Cells(last_row, REF_COLUMNS)).Value
+    return values or ()
+
+
+def read_ref_rows_openpyxl(workbook_path, sheet_name=REF_SHEET_NAME):
+    """All Ref rows (columns A:D) read with openpyxl; works without Excel, e.g. on Linux."""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(workbook_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name]
+        return list(sheet.iter_rows(min_col=1, max_col=REF_COLUMNS, values_only=True))
+    finally:
+        workbook.close()
+
+
+def collect_flash_codes(division_index, division_input):
+    """
+    Flash codes of one division (str) or several (list), in order and without repeats.
+    Divisions missing from the index are reported and skipped.
+    """
+    divisions = [division_input] if isinstance(division_input, str) else list(division_input)
+    flash_codes = []
+    for division in divisions:
+        codes = division_index.flash_codes(division)
+        if codes is None:
+            print(f"Error: Division '{division}' not found in 'Ref' sheet (Column A).")
+            continue
+        print(f"Found division '{division}' in 'Ref' sheet at row {division_index.row_of(division)}.")
+        if not codes:
+            print(f"No flash codes found for division '{division}'.")
+        flash_codes.extend(code for code in codes if code not in flash_codes)
+    return flash_codes
+
+
+def load_division_index_com(ref_sheet):
+    return DivisionIndex(read_ref_rows_com(ref_sheet))
+
+
+def load_division_index(workbook_path, sheet_name=REF_SHEET_NAME):
+    return DivisionIndex(read_ref_rows_openpyxl(workbook_path, sheet_name))
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage: python revenue_ref.py WORKBOOK [DIVISION ...]")
+        sys.exit(1)
+    index = load_division_index(sys.argv[1])
+    for division in sys.argv[2:] or index.divisions():
+        print(f"{division}: {index.flash_codes(division)}")
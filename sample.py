@@ -1,22 +1,14 @@
 
-# Import necessary modules and classes
+# Import necessary modules and classes. Only lightweight modules are imported here;
+# LangChain, LangGraph, Groq and the search tools are loaded on first use (see get_graph)
+import os
+import time
 from typing import Annotated, TypedDict
-from langchain_openai import AzureChatOpenAI
-from langchain.agents import initialize_agent, AgentType
-from langchain_community.utilities import ArxivAPIWrapper, WikipediaAPIWrapper
-from langchain.tools import Tool
-from langchain.memory import ConversationBufferMemory
-from langchain.agents import AgentExecutor, create_react_agent
-from langchain.prompts import PromptTemplate
-from langchain_community.tools import ArxivQueryRun, WikipediaQueryRun
-from langgraph.graph.message import add_messages
-from langchain_groq import ChatGroq
-from langgraph.graph import StateGraph, START, END
-from langgraph.prebuilt import ToolNode, tools_condition
-from IPython.display import Image, display
 from dotenv import load_dotenv
-from graphviz import Source
-import os
+from startup import LazyResource, print_import_report, wants_startup_report
+
+start_time = time.perf_counter()
+
 # Load environment variables from a .env file
 load_dotenv()
 
@@ -26,94 +18,124 @@ load_dotenv()
 os.environ["GOOGLE_API_KEY"] = os.getenv("GOOGLE_API_KEY")
 groq_api_key = os.getenv("GROQ_API_KEY")
 
-# Initialize Wikipedia API Wrapper with specific parameters
-api_wrapper = WikipediaAPIWrapper(top_k_results=1, doc_content_chars_max=300)
-wikipedia_tool = WikipediaQueryRun(
-    api_wrapper=api_wrapper,
-    name="Wikipedia_Search",  # Updated name
-    func=api_wrapper.run,
-    description="Search wikipedia for general knowledge of factual information"
-)
-
-# Initialize Arxiv API Wrapper with specific parameters
-api_wrapper = ArxivQueryRun(top_k_results=1, doc_content_chars_max=300)
-arxiv_tool = Tool(
-    api_wrapper=api_wrapper,
-    name="Arxiv_Paper_Search",  # Updated name
-    func=api_wrapper.run,
-    description="Search for academic papers on ArXiv using research topics"
-)
-
-# Define a prompt template for the chatbot
-prompt_template = PromptTemplate(
-    input_variables=["query"],
-    template=(
-        "You are an intelligent assistant that answers questions using Wikipedia and ArXiv.\n\n"
-        "User Query: {query}\n"
-        "Analyze the question, determine the best source (Wikipedia or ArXiv), and provide an informative response."
+# Heavy dependencies loaded lazily, listed for the --startup-report import timings
+HEAVY_IMPORTS = [
+    "langchain_core",
+    "langchain.tools",
+    "langchain_community.utilities",
+    "langchain_community.tools",
+    "langgraph.graph",
+    "langgraph.prebuilt",
+    "langchain_groq",
+    "llm_router",
+    "parallel_tools",
+    "tool_cache",
+]
+
+
+def build_graph():
+    """Build and compile the Wikipedia/Arxiv agent graph, importing its dependencies on first use."""
+    from langchain_community.utilities import WikipediaAPIWrapper
+    from langchain.tools import Tool
+    from langchain_community.tools import ArxivQueryRun, WikipediaQueryRun
+    from langgraph.graph.message import add_messages
+    from llm_router import get_chat_model
+    from langgraph.graph import StateGraph, START
+    from langgraph.prebuilt import ToolNode, tools_condition
+    from conversation_memory import compact_messages
+    from parallel_tools import AGENT_ASYNC, make_parallel_tool_node
+    from tool_cache import cached_tool
+
+    # Initialize Wikipedia API Wrapper with specific parameters
+    api_wrapper = WikipediaAPIWrapper(top_k_results=1, doc_content_chars_max=300)
+    wikipedia_tool = WikipediaQueryRun(
+        api_wrapper=api_wrapper,
+        name="Wikipedia_Search",  # Updated name
+        func=api_wrapper.run,
+        description="Search wikipedia for general knowledge of factual information"
     )
-)
-
-# List of tools available to the chatbot
-tools = [wikipedia_tool, arxiv_tool]
-
-# Define a state dictionary with annotated messages
-class State(TypedDict):
-    messages: Annotated[list, add_messages]
-
-# Initialize a state graph
-graph_builder = StateGraph(State)
-
-# Initialize conversation memory
-# memory = ConversationBufferMemory(memory_key="Chathistory", return_messages=True)
-
-# Initialize the language model with the Groq API key
-llm = ChatGroq(groq_api_key=groq_api_key, model_name="Gemma2-9b-It")
-# llm = AzureChatOpenAI(
-#     deployment_name="gpt-4o-mini",
-#     api_version="2024-05-01-preview",
-#     temperature=0.7
-# )
-
-# Bind tools to the language model with memory
-llm_with_tools = llm.bind_tools(tools=tools)
-
-# Define the chatbot function
-def chatbot(state: State):
-    try:
-        return {"messages": [llm_with_tools.invoke(state["messages"])]}
-    except Exception as e:
-        print(f"Error in chatbot function: {e}")
-        return {"messages": []}
-
-# Add nodes and edges to the state graph
-graph_builder.add_node("chatbot", chatbot)
-tool_node = ToolNode(tools=tools)
-graph_builder.add_node("tools", tool_node)
-
-graph_builder.add_conditional_edges(
-    "chatbot",
-    tools_condition,
-)
-graph_builder.add_edge("tools", "chatbot")
-graph_builder.add_edge(START, "chatbot")
-
-# Compile the state graph
-graph = graph_builder.compile()
-
-# Define user input 
-user_input = input("Enter query here : ")
-
-# Stream events through the graph
-events = graph.stream(
-    {"messages": [("user", user_input)]}, stream_mode="values"
-)
-
-# Process and print events
-for event in events:
-    try:
-        event["messages"][-1].pretty_print()
-    except Exception as e:
-        print(f"Error processing event: {e}")
 
+    # Initialize Arxiv API Wrapper with specific parameters
+    api_wrapper = ArxivQueryRun(top_k_results=1, doc_content_chars_max=300)
+    arxiv_tool = Tool(
+        api_wrapper=api_wrapper,
+        name="Arxiv_Paper_Search",  # Updated name
+        func=api_wrapper.run,
+        description="Search for academic papers on ArXiv using research topics"
+    )
+
+    # List of tools available to the chatbot; repeated lookups are served from a TTL/LRU cache
+    tools = [cached_tool(wikipedia_tool), cached_tool(arxiv_tool)]
+
+    # Define a state dictionary with annotated messages
+    class State(TypedDict):
+        messages: Annotated[list, add_messages]
+
+    # Initialize a state graph
+    graph_builder = StateGraph(State)
+
+    # Initialize the language model: Groq's Gemma2-9b-It, or the fastest healthy backend in LLM_ROUTER_MODELS
+    llm = get_chat_model("Gemma2-9b-It")
+    # llm = AzureChatOpenAI(
+    #     deployment_name="gpt-4o-mini",
+    #     api_version="2024-05-01-preview",
+    #     temperature=0.7
+    # )
+
+    # Bind tools to the language model with memory
+    llm_with_tools = llm.bind_tools(tools=tools)
+
+    # Define the chatbot function; old turns and tool outputs are compacted to a token budget
+    def chatbot(state: State):
+        try:
+            return {"messages": [llm_with_tools.invoke(compact_messages(state["messages"]))]}
+        except Exception as e:
+            print(f"Error in chatbot function: {e}")
+            return {"messages": []}
+
+    # Add nodes and edges to the state graph
+    graph_builder.add_node("chatbot", chatbot)
+    # Independent tool calls from one assistant message run concurrently, each with a timeout
+    tool_node = make_parallel_tool_node(tools) if AGENT_ASYNC else ToolNode(tools=tools)
+    graph_builder.add_node("tools", tool_node)
+
+    graph_builder.add_conditional_edges(
+        "chatbot",
+        tools_condition,
+    )
+    graph_builder.add_edge("tools", "chatbot")
+    graph_builder.add_edge(START, "chatbot")
+
+    # Compile the state graph
+    return graph_builder.compile()
+
+_graph = LazyResource(build_graph)
+
+
+def get_graph():
+    """Return the compiled agent graph, building it on first use."""
+    return _graph.get()
+
+
+if __name__ == "__main__":
+    if wants_startup_report():
+        print_import_report(HEAVY_IMPORTS)
+
+    # Build the graph in the background while the user types
+    _graph.warm_up()
+    print(f"Time to prompt: {time.perf_counter() - start_time:.3f}s")
+
+    # Define user input
+    user_input = input("Enter query here : ")
+
+    from parallel_tools import print_graph_events
+    from tool_cache import get_tool_cache
+
+    # Stream events through the graph and print each new message
+    print_graph_events(
+        get_graph(),
+        {"messages": [("user", user_input)]},
+    )
 
+    # Report how many tool lookups were served from the cache
+    print("Tool cache:", get_tool_cache().stats())
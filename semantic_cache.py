@@ -0,0 +1,122 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from embedding_cache import get_embeddings
+from vector_registry import on_invalidate
+
+# Minimum cosine similarity between two questions for a cached answer to be reused
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "512"))
+SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "3600"))
+
+
+class SemanticCache:
+    """
+    Answer cache keyed by question meaning rather than exact text.
+
+    A question is embedded and compared with the questions already answered;
+    if the best cosine similarity reaches `threshold`, the stored answer and
+    context are returned without calling the retriever or the LLM. Entries
+    expire after `ttl_seconds` and the least recently used entry is evicted
+    once `max_entries` is exceeded.
+    """
+
+    def __init__(self, embeddings, threshold=SEMANTIC_CACHE_THRESHOLD,
+                 max_entries=SEMANTIC_CACHE_MAX_ENTRIES, ttl_seconds=SEMANTIC_CACHE_TTL_SECONDS):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _vector(self, question):
+        vector = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expire(self, now):
+        expired = [key for key, entry in self._entries.items() if now - entry["created_at"] > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+
+    def get(self, question):
+        """Return the cached entry for a similar question, or None."""
+        vector = self._vector(question)
+        with self._lock:
+            self._expire(time.time())
+            best_key, best_similarity = None, -1.0
+            if self._entries:
+                keys = list(self._entries)
+                matrix = np.stack([self._entries[key]["vector"] for key in keys])
+                similarities = matrix @ vector
+                best = int(np.argmax(similarities))
+                best_key, best_similarity = keys[best], float(similarities[best])
+            if best_key is None or best_similarity < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best_key)
+            entry = self._entries[best_key]
+            return {
+                "question": entry["question"],
+                "answer": entry["answer"],
+                "context": entry["context"],
+                "similarity": best_similarity,
+            }
+
+    def put(self, question, answer, context):
+        vector = self._vector(question)
+        with self._lock:
+            self._entries[self._next_id] = {
+                "question": question,
+                "answer": answer,
+                "context": context,
+                "vector": vector,
+                "created_at": time.time(),
+            }
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def _clear_on_invalidate(name):
+    cache = _caches.get(name)
+    if cache is not None:
+        cache.clear()
+
+
+on_invalidate(_clear_on_invalidate)
+
+
+def get_semantic_cache(corpus, embeddings=None):
+    """
+    Return the process-wide semantic cache for a corpus.
+
+    The cache is emptied whenever the corpus's shared vector store is
+    invalidated in vector_registry, so answers never outlive the index they
+    were retrieved from.
+    """
+    with _caches_lock:
+        cache = _caches.get(corpus)
+        if cache is None:
+            cache = _caches[corpus] = SemanticCache(embeddings or get_embeddings())
+        return cache
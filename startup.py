@@ -0,0 +1,76 @@
+import importlib
+import sys
+import threading
+import time
+
+
+def time_imports(modules):
+    """
+    Import each module in order and return [(module, seconds)].
+
+    Times are incremental: a module's shared dependencies are charged to
+    whichever listed module imported them first. Modules that are not
+    installed are reported with a time of None. For a full per-module tree,
+    run `python -X importtime <script>`.
+    """
+    timings = []
+    for name in modules:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+            timings.append((name, time.perf_counter() - start))
+        except ImportError:
+            timings.append((name, None))
+    return timings
+
+
+def print_import_report(modules):
+    """Print the import cost of each heavy dependency, slowest first."""
+    timings = time_imports(modules)
+    print("Import time per dependency:")
+    for name, seconds in sorted(timings, key=lambda t: -(t[1] or 0)):
+        shown = "not installed" if seconds is None else f"{seconds * 1000:8.1f} ms"
+        print(f"  {name:<40} {shown}")
+    total = sum(seconds for _, seconds in timings if seconds)
+    print(f"  {'total':<40} {total * 1000:8.1f} ms")
+
+
+class LazyResource:
+    """
+    Thread-safe build-once holder for an expensive object.
+
+    `get()` builds on first use; `warm_up()` starts the build on a daemon
+    thread so it overlaps with, e.g., waiting for user input. A build error
+    is re-raised by every later `get()`.
+    """
+
+    def __init__(self, build):
+        self._build = build
+        self._lock = threading.Lock()
+        self._value = None
+        self._error = None
+        self._built = False
+
+    def get(self):
+        with self._lock:
+            if not self._built:
+                try:
+                    self._value = self._build()
+                except BaseException as e:
+                    self._error = e
+                self._built = True
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+    def warm_up(self):
+        def run():
+            try:
+                self.get()
+            except BaseException:
+                pass  # Reported when the caller asks for the value
+        threading.Thread(target=run, daemon=True).start()
+
+
+def wants_startup_report():
+    return "--startup-report" in sys.argv
@@ -0,0 +1,154 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_core.tools import StructuredTool, Tool
+
+TOOL_CACHE_TTL_SECONDS = float(os.getenv("TOOL_CACHE_TTL_SECONDS", "86400"))
+TOOL_CACHE_MAX_ENTRIES = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "1024"))
+
+# Optional SQLite file that keeps tool results across restarts (e.g. ./tool_cache.sqlite);
+# unset to cache in memory only
+TOOL_CACHE_PATH = os.getenv("TOOL_CACHE_PATH", "")
+
+
+def normalize_query(value):
+    """Case- and whitespace-insensitive form of a tool argument."""
+    if isinstance(value, str):
+        return re.sub(r"\s+", " ", value).strip().lower()
+    if isinstance(value, dict):
+        return {k: normalize_query(v) for k, v in value.items()}
+    return value
+
+
+def tool_cache_key(tool_name, args):
+    return tool_name + ":" + json.dumps(normalize_query(args), sort_keys=True, default=str)
+
+
+class TTLCache:
+    """
+    Size-bounded LRU cache whose entries expire after `ttl_seconds`.
+
+    If `path` is given, entries are also written to SQLite and read back on a
+    memory miss, so results survive restarts (still subject to the TTL).
+    """
+
+    def __init__(self, ttl_seconds=TOOL_CACHE_TTL_SECONDS, max_entries=TOOL_CACHE_MAX_ENTRIES, path=None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS tool_results (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._conn is not None:
+                row = self._conn.execute("SELECT value, created_at FROM tool_results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    entry = (json.loads(row[0]), row[1])
+                    self._entries[key] = entry
+            if entry is not None and now - entry[1] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._entries[key] = (value, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO tool_results (key, value, created_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), now),
+                )
+                self._conn.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries),
+                "hit_rate": self.hits / total if total else 0.0}
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_tool_cache():
+    """Process-wide tool result cache, persisted to TOOL_CACHE_PATH when it is set."""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = TTLCache(path=TOOL_CACHE_PATH or None)
+        return _shared_cache
+
+
+def cached_tool(tool, cache=None):
+    """
+    Wrap a LangChain tool so identical (normalised) calls are answered from `cache`.
+
+    The wrapper keeps the tool's name, description and argument schema, so it
+    can be bound to a model in place of the original. A plain single-input
+    Tool (no args_schema) stays a single-input Tool and receives the query
+    string unchanged. Errors are not cached.
+    """
+    cache = cache or get_tool_cache()
+
+    def lookup(args, call):
+        key = tool_cache_key(tool.name, args)
+        result = cache.get(key)
+        if result is None:
+            result = call()
+            cache.put(key, result)
+        return result
+
+    async def alookup(args, call):
+        key = tool_cache_key(tool.name, args)
+        result = cache.get(key)
+        if result is None:
+            result = await call()
+            cache.put(key, result)
+        return result
+
+    if tool.args_schema is None:
+        def run_text(query: str):
+            return lookup({"query": query}, lambda: tool.invoke(query))
+
+        async def arun_text(query: str):
+            return await alookup({"query": query}, lambda: tool.ainvoke(query))
+
+        return Tool(name=tool.name, description=tool.description, func=run_text, coroutine=arun_text)
+
+    def run(**kwargs):
+        return lookup(kwargs, lambda: tool.invoke(kwargs))
+
+    async def arun(**kwargs):
+        return await alookup(kwargs, lambda: tool.ainvoke(kwargs))
+
+    return StructuredTool.from_function(
+        func=run,
+        coroutine=arun,
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+    )
@@ -0,0 +1,72 @@
+import threading
+
+# Process-wide vector stores shared by every Streamlit session, keyed by corpus name.
+# Streamlit re-runs the page script for each session but imports this module only
+# once per server process, so everything here is shared.
+_stores = {}
+_generations = {}
+_build_locks = {}
+_invalidate_callbacks = []
+_lock = threading.Lock()
+
+
+def _build_lock(name):
+    with _lock:
+        return _build_locks.setdefault(name, threading.Lock())
+
+
+def get_vectorstore(name, build):
+    """
+    Return the shared vector store for a corpus, building it on first use.
+
+    `build` is a zero-argument function returning the vector store. Concurrent
+    sessions asking for the same corpus wait for a single build instead of each
+    embedding the corpus themselves. The returned store must be treated as
+    read-only by callers.
+    """
+    store = _stores.get(name)
+    if store is not None:
+        return store
+    with _build_lock(name):
+        # Another session may have finished the build while we were waiting
+        store = _stores.get(name)
+        if store is None:
+            store = build()
+            with _lock:
+                _stores[name] = store
+                _generations[name] = _generations.get(name, 0) + 1
+        return store
+
+
+def peek_vectorstore(name):
+    """Return the shared vector store for a corpus if it has been built, else None."""
+    return _stores.get(name)
+
+
+def generation(name):
+    """Number of times the corpus has been (re)built in this process; 0 if never."""
+    return _generations.get(name, 0)
+
+
+def on_invalidate(callback):
+    """Register `callback(name)` to run whenever a corpus is invalidated."""
+    with _lock:
+        _invalidate_callbacks.append(callback)
+
+
+def invalidate(name=None):
+    """Drop the shared store for one corpus (or all corpora) so the next request rebuilds it."""
+    with _lock:
+        names = [name] if name is not None else list(_stores)
+        for n in names:
+            _stores.pop(n, None)
+        callbacks = list(_invalidate_callbacks)
+    for n in names:
+        for callback in callbacks:
+            callback(n)
+
+
+def reload_vectorstore(name, build):
+    """Rebuild the shared store for a corpus now and return the new copy."""
+    invalidate(name)
+    return get_vectorstore(name, build)
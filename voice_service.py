@@ -0,0 +1,401 @@
+import math
+import os
+import queue
+import re
+import threading
+import time
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+from instrumentation import record
+
+# Speech recognizer: google (remote), sphinx (offline, needs pocketsphinx) or stub (canned text, for tests)
+VOICE_RECOGNIZER = os.getenv("VOICE_RECOGNIZER", "google")
+
+# Text-to-speech output: pyttsx3, or none to only log what would be spoken
+VOICE_TTS = os.getenv("VOICE_TTS", "pyttsx3")
+
+# Voice-activity detection: trailing silence that ends an utterance, and capture limits
+VOICE_SILENCE_SECONDS = float(os.getenv("VOICE_SILENCE_SECONDS", "0.8"))
+VOICE_START_TIMEOUT_SECONDS = float(os.getenv("VOICE_START_TIMEOUT_SECONDS", "5"))
+VOICE_MAX_SECONDS = float(os.getenv("VOICE_MAX_SECONDS", "15"))
+
+# Ambient noise sampled before listening, and how far above it speech must be
+CALIBRATION_SECONDS = 0.3
+SPEECH_ENERGY_RATIO = 1.5
+MIN_SPEECH_ENERGY = 300
+
+# Same fallbacks Voice_bot.py has always shown
+NOT_UNDERSTOOD = "Sorry, I couldn't understand that."
+SERVICE_DOWN = "Sorry, my speech service is down."
+NOTHING_HEARD = "Sorry, I didn't hear anything."
+
+# Sessions whose current turn the long-lived service keeps track of; the least recently used is forgotten
+VOICE_MAX_SESSIONS = int(os.getenv("VOICE_MAX_SESSIONS", "256"))
+
+# Sentences NullSpeaker keeps for inspection
+NULL_SPEAKER_HISTORY = 1000
+
+# Words whose trailing period doesn't end a sentence
+ABBREVIATIONS = {"e.g", "i.e", "etc", "vs", "mr", "mrs", "ms", "dr", "st", "no", "inc", "u.s"}
+
+# Sentence end: terminal punctuation, optional closing quotes/brackets, then whitespace
+SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*\s+|\n+")
+
+
+class SentenceBuffer:
+    """Collects streamed LLM tokens and returns each sentence as soon as it is complete."""
+
+    def __init__(self):
+        self.text = ""
+
+    def feed(self, token):
+        self.text += token
+        sentences, start = [], 0
+        for match in SENTENCE_END.finditer(self.text):
+            words = self.text[start:match.start()].split()
+            last_word = words[-1].lower() if words else ""
+            # "e.g. " or an initial such as "J. " is not the end of a sentence, but "is 5. " is
+            initial = len(last_word) == 1 and last_word.isalpha()
+            if match.group().strip() == "." and (last_word in ABBREVIATIONS or initial):
+                continue
+            sentence = self.text[start:match.end()].strip()
+            if sentence:
+                sentences.append(sentence)
+            start = match.end()
+        self.text = self.text[start:]
+        return sentences
+
+    def flush(self):
+        rest, self.text = self.text.strip(), ""
+        return rest
+
+
+class AudioClip:
+    """Raw mono PCM audio of one utterance."""
+
+    def __init__(self, frames, sample_rate, sample_width):
+        self.frames = frames
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+
+    @property
+    def duration(self):
+        return len(self.frames) / (self.sample_rate * self.sample_width)
+
+
+class RecognitionError(Exception):
+    """The recognizer could not be reached or failed."""
+
+
+def rms(chunk, sample_width):
+    """Root-mean-square energy of a little-endian PCM chunk."""
+    samples = array({1: "b", 2: "h", 4: "i"}[sample_width], chunk[:len(chunk) - len(chunk) % sample_width])
+    if not samples:
+        return 0.0
+    return math.sqrt(sum(s * s for s in samples) / len(samples))
+
+
+def capture_utterance(read_chunk, sample_rate, sample_width, chunk_frames, cancel_event=None,
+                      silence_seconds=VOICE_SILENCE_SECONDS, start_timeout=VOICE_START_TIMEOUT_SECONDS,
+                      max_seconds=VOICE_MAX_SECONDS):
+    """
+    Read audio chunks with `read_chunk()` until one utterance has been heard.
+
+    The first CALIBRATION_SECONDS set the ambient energy level; speech starts
+    at the first chunk clearly above it and ends after `silence_seconds` of
+    quiet, so recognition can start as soon as the speaker stops. Returns an
+    AudioClip, or None if nothing was said within `start_timeout` or
+    `cancel_event` was set.
+    """
+    chunk_seconds = chunk_frames / sample_rate
+    elapsed = 0.0
+    ambient = []
+    while elapsed < CALIBRATION_SECONDS:
+        ambient.append(rms(read_chunk(), sample_width))
+        elapsed += chunk_seconds
+    threshold = max(MIN_SPEECH_ENERGY, SPEECH_ENERGY_RATIO * sum(ambient) / len(ambient))
+
+    frames, speaking, quiet = [], False, 0.0
+    elapsed = 0.0
+    pre_roll = []  # Keep the chunk before speech starts so the first syllable isn't clipped
+    while elapsed < max_seconds:
+        if cancel_event is not None and cancel_event.is_set():
+            return None
+        chunk = read_chunk()
+        elapsed += chunk_seconds
+        loud = rms(chunk, sample_width) > threshold
+        if not speaking:
+            if loud:
+                speaking = True
+                frames.extend(pre_roll)
+            elif elapsed >= start_timeout:
+                return None
+            else:
+                pre_roll = [chunk]
+                continue
+        frames.append(chunk)
+        quiet = 0.0 if loud else quiet + chunk_seconds
+        if quiet >= silence_seconds:
+            break
+    return AudioClip(b"".join(frames), sample_rate, sample_width) if frames else None
+
+
+class MicrophoneSource:
+    """Default microphone, opened only for the duration of one capture."""
+
+    def __enter__(self):
+        import speech_recognition as sr
+
+        self.microphone = sr.Microphone()
+        self.source = self.microphone.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self.microphone.__exit__(*exc)
+
+    def capture(self, cancel_event=None):
+        source = self.source
+        return capture_utterance(lambda: source.stream.read(source.CHUNK), source.SAMPLE_RATE,
+                                 source.SAMPLE_WIDTH, source.CHUNK, cancel_event)
+
+
+class StubSource:
+    """Audio source that "hears" one second of silence at once; pairs with StubRecognizer offline."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def capture(self, cancel_event=None):
+        return AudioClip(bytes(32000), 16000, 2)
+
+
+class GoogleRecognizer:
+    """Google Web Speech API through speech_recognition (needs network access)."""
+
+    def __init__(self):
+        import speech_recognition as sr
+
+        self.sr = sr
+        self.recognizer = sr.Recognizer()
+
+    def recognize(self, clip):
+        audio = self.sr.AudioData(clip.frames, clip.sample_rate, clip.sample_width)
+        try:
+            return self.recognizer.recognize_google(audio)
+        except self.sr.UnknownValueError:
+            return ""
+        except self.sr.RequestError as e:
+            raise RecognitionError(str(e)) from e
+
+
+class SphinxRecognizer(GoogleRecognizer):
+    """Offline CMU Sphinx recognition (pip install pocketsphinx)."""
+
+    def recognize(self, clip):
+        audio = self.sr.AudioData(clip.frames, clip.sample_rate, clip.sample_width)
+        try:
+            return self.recognizer.recognize_sphinx(audio)
+        except self.sr.UnknownValueError:
+            return ""
+        except self.sr.RequestError as e:
+            raise RecognitionError(str(e)) from e
+
+
+class StubRecognizer:
+    """Offline recognizer returning canned transcripts in turn, for tests and demos without a microphone."""
+
+    def __init__(self, responses=("what is title insurance",)):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def recognize(self, clip):
+        text = self.responses[self.calls % len(self.responses)]
+        self.calls += 1
+        return text
+
+
+class Pyttsx3Speaker:
+    """Local text-to-speech; the engine must be created and driven on the worker thread."""
+
+    def __init__(self):
+        import pyttsx3
+
+        self.engine = pyttsx3.init()
+
+    def say(self, text):
+        self.engine.say(text)
+        self.engine.runAndWait()
+
+    def stop(self):
+        self.engine.stop()
+
+
+class NullSpeaker:
+    """Speaker that only logs, for headless runs and tests."""
+
+    def __init__(self):
+        self.spoken = deque(maxlen=NULL_SPEAKER_HISTORY)
+
+    def say(self, text):
+        self.spoken.append(text)
+        print("Speaking:", text)
+
+    def stop(self):
+        pass
+
+
+RECOGNIZERS = {"google": GoogleRecognizer, "sphinx": SphinxRecognizer, "stub": StubRecognizer}
+SPEAKERS = {"pyttsx3": Pyttsx3Speaker, "none": NullSpeaker}
+
+
+class _Turn:
+    def __init__(self):
+        self.cancel_event = threading.Event()
+        self.started = time.perf_counter()
+        self.first_audio = True
+
+
+class VoiceService:
+    """
+    One long-lived worker thread that owns the TTS engine and the microphone.
+
+    Callers (e.g. Streamlit sessions, identified by `session_id`) never block
+    on audio: `speak` queues a sentence, `listen` queues a capture and returns
+    a Future with the transcript. Requests are handled one at a time, so the
+    bot never listens to itself. `start_turn` and `cancel` cancel a session's
+    queued and playing speech and any capture in progress; the Event returned
+    by `start_turn` also lets answer generation stop with it.
+    """
+
+    def __init__(self, recognizer=None, speaker_factory=None, source_factory=None, max_sessions=VOICE_MAX_SESSIONS):
+        self.recognizer = recognizer
+        self.speaker_factory = speaker_factory or SPEAKERS[VOICE_TTS]
+        self.source_factory = source_factory or (StubSource if VOICE_RECOGNIZER == "stub" else MicrophoneSource)
+        self.requests = queue.Queue()
+        self.turns = OrderedDict()  # session_id -> current _Turn, least recently used first
+        self.max_sessions = max_sessions
+        self.current = None  # (session_id, turn) being served by the worker
+        self.speaker = None
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, daemon=True, name="voice-service").start()
+
+    def _remember(self, session_id, turn):
+        # Caller holds the lock. Requests already queued keep their own reference to the turn
+        self.turns[session_id] = turn
+        self.turns.move_to_end(session_id)
+        while len(self.turns) > self.max_sessions:
+            self.turns.popitem(last=False)
+
+    def _turn(self, session_id):
+        with self._lock:
+            turn = self.turns.get(session_id) or _Turn()
+            self._remember(session_id, turn)
+            return turn
+
+    def start_turn(self, session_id):
+        """Cancel the session's previous turn and start timing a new one."""
+        self.cancel(session_id)
+        turn = _Turn()
+        with self._lock:
+            self._remember(session_id, turn)
+        return turn.cancel_event
+
+    def cancel(self, session_id):
+        """Stop the session's speech (queued and playing) and any capture in progress."""
+        with self._lock:
+            turn = self.turns.get(session_id)
+        if turn is None:
+            return
+        turn.cancel_event.set()
+        current = self.current
+        if current is not None and current[1] is turn and self.speaker is not None:
+            self.speaker.stop()
+
+    def speak(self, session_id, text):
+        """Queue one sentence (or a whole answer) for the session's current turn."""
+        if text:
+            self.requests.put(("speak", self._turn(session_id), session_id, text))
+
+    def speak_text(self, session_id, text):
+        """Start a new turn and queue `text` sentence by sentence."""
+        self.start_turn(session_id)
+        buffer = SentenceBuffer()
+        for sentence in buffer.feed(text) + [buffer.flush()]:
+            self.speak(session_id, sentence)
+
+    def listen(self, session_id):
+        """
+        Barge in on the session's speech and capture one utterance. Returns a
+        Future with the transcript, a fallback message, or None if cancelled.
+        """
+        self.start_turn(session_id)
+        future = Future()
+        self.requests.put(("listen", self._turn(session_id), session_id, future))
+        return future
+
+    def _run(self):
+        while True:
+            kind, turn, session_id, payload = self.requests.get()
+            if turn.cancel_event.is_set():
+                if kind == "listen":
+                    payload.cancel()
+                continue
+            self.current = (session_id, turn)
+            try:
+                if kind == "speak":
+                    self._speak(turn, payload)
+                else:
+                    self._listen(turn, payload)
+            except Exception as e:
+                print(f"Voice service error: {e}")
+                if kind == "listen" and not payload.done():
+                    payload.set_result(SERVICE_DOWN)
+            finally:
+                self.current = None
+
+    def _speak(self, turn, text):
+        if self.speaker is None:
+            self.speaker = self.speaker_factory()
+        if turn.first_audio:
+            turn.first_audio = False
+            record("time_to_first_audio", time.perf_counter() - turn.started)
+        self.speaker.say(text)
+
+    def _listen(self, turn, future):
+        if not future.set_running_or_notify_cancel():
+            return
+        if self.recognizer is None:
+            self.recognizer = RECOGNIZERS[VOICE_RECOGNIZER]()
+        start = time.perf_counter()
+        with self.source_factory() as source:
+            clip = source.capture(turn.cancel_event)
+        record("asr_capture", time.perf_counter() - start)
+        if clip is None:
+            future.set_result(None if turn.cancel_event.is_set() else NOTHING_HEARD)
+            return
+        start = time.perf_counter()
+        try:
+            text = self.recognizer.recognize(clip)
+        except RecognitionError:
+            future.set_result(SERVICE_DOWN)
+            return
+        record("asr_recognize", time.perf_counter() - start)
+        future.set_result(text.lower() if text else NOT_UNDERSTOOD)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_voice_service():
+    """Process-wide voice service shared by every session."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = VoiceService()
+        return _service
@@ -0,0 +1,234 @@
+import hashlib
+import json
+import os
+import time
+
+import requests
+from bs4 import BeautifulSoup
+from langchain_core.documents import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from census_store import INDEX_CACHE_DIR, load_index, save_index
+from embedding_cache import EMBEDDING_MODEL, get_embeddings
+from index_factory import VECTOR_INDEX_TYPE, supports_removal
+from ingest import ingest_documents
+
+# Fetched HTML, extracted text and HTTP validators, one set of files per URL
+WEB_CACHE_DIR = os.getenv("WEB_CACHE_DIR", "./web_cache")
+
+WEB_FETCH_TIMEOUT_SECONDS = float(os.getenv("WEB_FETCH_TIMEOUT_SECONDS", "20"))
+
+# Same environment variable WebBaseLoader reads for its User-Agent header
+USER_AGENT = os.getenv("USER_AGENT", "GenerativeAI-web-cache/1.0")
+
+
+def url_key(url):
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()[:16]
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def extract_document(html, url):
+    """Parse a page the way WebBaseLoader does: all visible text, plus source/title/description/language."""
+    soup = BeautifulSoup(html, "html.parser")
+    metadata = {"source": url}
+    if title := soup.find("title"):
+        metadata["title"] = title.get_text()
+    if description := soup.find("meta", attrs={"name": "description"}):
+        metadata["description"] = description.get("content", "No description found.")
+    if html_tag := soup.find("html"):
+        metadata["language"] = html_tag.get("lang", "No language found.")
+    return Document(page_content=soup.get_text(), metadata=metadata)
+
+
+def _write_atomic(path, data):
+    tmp_path = path + ".tmp"
+    mode = "wb" if isinstance(data, bytes) else "w"
+    with open(tmp_path, mode, **({} if mode == "wb" else {"encoding": "utf-8"})) as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class WebPage:
+    """
+    One fetched page. `status` is "new", "changed", "unchanged" (200 with the
+    same text), "not_modified" (304) or "offline" (fetch failed, cached copy used).
+    """
+
+    def __init__(self, url, document, content_hash, status, fetch_seconds=None, error=None):
+        self.url = url
+        self.document = document
+        self.content_hash = content_hash
+        self.status = status
+        self.fetch_seconds = fetch_seconds
+        self.error = error
+
+
+class WebPageCache:
+    """
+    Disk cache of fetched web pages that revalidates with conditional GETs.
+
+    Each URL's raw HTML, extracted text and metadata (ETag, Last-Modified and
+    the hash of the extracted text) are stored under `cache_dir`. A refetch
+    sends If-None-Match / If-Modified-Since, so an unchanged page costs a 304
+    and no parsing; a page that is served again but whose text hasn't changed
+    keeps its old content hash.
+    """
+
+    def __init__(self, cache_dir=WEB_CACHE_DIR, session=None, timeout=WEB_FETCH_TIMEOUT_SECONDS):
+        self.cache_dir = cache_dir
+        self.session = session or requests.Session()
+        self.session.headers.setdefault("User-Agent", USER_AGENT)
+        self.timeout = timeout
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url, suffix):
+        return os.path.join(self.cache_dir, url_key(url) + suffix)
+
+    def cached(self, url):
+        """Cached metadata and Document for `url`, or (None, None)."""
+        meta_path = self._path(url, ".json")
+        if not os.path.exists(meta_path):
+            return None, None
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(self._path(url, ".txt"), encoding="utf-8") as f:
+            document = Document(page_content=f.read(), metadata=meta["metadata"])
+        return meta, document
+
+    def store(self, url, html, document, headers):
+        """Save a freshly downloaded page; returns its metadata."""
+        meta = {
+            "url": url,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "content_hash": content_hash(document.page_content),
+            "fetched_at": time.time(),
+            "metadata": document.metadata,
+        }
+        _write_atomic(self._path(url, ".html"), html)
+        _write_atomic(self._path(url, ".txt"), document.page_content)
+        _write_atomic(self._path(url, ".json"), json.dumps(meta, indent=2))
+        return meta
+
+    def conditional_headers(self, meta):
+        headers = {}
+        if meta and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def page_from_response(self, url, meta, document, status_code, body, headers, elapsed):
+        """Turn an HTTP response (from any client) into a WebPage, updating the cache."""
+        if status_code == 304 and document is not None:
+            return WebPage(url, document, meta["content_hash"], "not_modified", elapsed)
+        if isinstance(body, bytes):
+            body = body.decode("utf-8", errors="replace")
+        fresh = extract_document(body, url)
+        new_meta = self.store(url, body, fresh, headers)
+        if meta is None:
+            status = "new"
+        elif new_meta["content_hash"] == meta["content_hash"]:
+            status = "unchanged"
+        else:
+            status = "changed"
+        return WebPage(url, fresh, new_meta["content_hash"], status, elapsed)
+
+    def fetch(self, url):
+        """Fetch `url` (conditionally if cached); falls back to the cached copy if the request fails."""
+        meta, document = self.cached(url)
+        start = time.perf_counter()
+        try:
+            response = self.session.get(url, headers=self.conditional_headers(meta), timeout=self.timeout)
+            if response.status_code != 304:
+                response.raise_for_status()
+        except requests.RequestException as e:
+            if document is None:
+                raise
+            print(f"Fetching {url} failed ({e}); using the cached copy")
+            return WebPage(url, document, meta["content_hash"], "offline", time.perf_counter() - start, str(e))
+        return self.page_from_response(url, meta, document, response.status_code, response.text,
+                                       response.headers, time.perf_counter() - start)
+
+
+def web_index_key(name, chunk_size, chunk_overlap, model_name, index_type):
+    settings = {"chunk_size": chunk_size, "chunk_overlap": chunk_overlap, "model": model_name,
+                "index_type": index_type}
+    return name + "-" + hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def chunk_id_for(url, page_hash, i):
+    return f"{url_key(url)}:{page_hash[:12]}:{i}"
+
+
+def update_web_vectorstore(name, pages, chunk_size=1000, chunk_overlap=200, model_name=EMBEDDING_MODEL,
+                           index_type=VECTOR_INDEX_TYPE, cache_dir=INDEX_CACHE_DIR, **index_params):
+    """
+    Bring the persisted index `name` in line with `pages` (WebPage objects, any iterable).
+
+    Pages whose content hash matches the manifest are neither split nor
+    embedded again; changed pages have their old vectors removed and are
+    re-indexed, and URLs that are no longer listed are dropped.
+    """
+    embeddings = get_embeddings(model_name)
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                                                   add_start_index=True)
+    index_path = os.path.join(cache_dir, web_index_key(name, chunk_size, chunk_overlap, embeddings.model_name,
+                                                       index_type))
+    vectorstore, manifest = load_index(index_path, embeddings, **index_params)
+
+    hashes = {}
+    chunk_counts = {}
+
+    def changed_documents():
+        for page in pages:
+            hashes[page.url] = page.content_hash
+            entry = manifest.get(page.url)
+            if entry is None or entry["content_hash"] != page.content_hash:
+                chunk_counts[page.url] = 0
+                yield page.document
+
+    def chunk_id(chunk):
+        url = chunk.metadata["source"]
+        chunk_counts[url] += 1
+        return chunk_id_for(url, hashes[url], chunk_counts[url] - 1)
+
+    # Pages are streamed straight from the fetcher into split -> embed -> index. Old vectors of a
+    # changed page are removed afterwards, once its new content is in (chunk IDs include the hash).
+    rebuild = False
+    if vectorstore is not None and not supports_removal(vectorstore):
+        # HNSW and IVF indexes cannot drop vectors safely, so any changed or unlisted page means a full rebuild
+        # (embeddings come from the cache); the page list has to be materialised to find out
+        pages = list(pages)
+        current = {page.url: page.content_hash for page in pages}
+        if any(current.get(url) != entry["content_hash"] for url, entry in manifest.items()):
+            vectorstore, manifest, rebuild = None, {}, True
+
+    vectorstore = ingest_documents(changed_documents(), embeddings, text_splitter, vectorstore=vectorstore,
+                                   chunk_id=chunk_id, index_type=index_type, **index_params)
+
+    stale_ids = [chunk for url, entry in manifest.items()
+                 if hashes.get(url) != entry["content_hash"] for chunk in entry["chunk_ids"]]
+    if stale_ids and vectorstore is not None:
+        vectorstore.delete(stale_ids)
+    manifest = {url: manifest[url] for url in hashes if url in manifest and url not in chunk_counts}
+    for url, count in chunk_counts.items():
+        manifest[url] = {"content_hash": hashes[url],
+                         "chunk_ids": [chunk_id_for(url, hashes[url], i) for i in range(count)]}
+
+    if not chunk_counts and not stale_ids and not rebuild:
+        print(f"Web index {name} is up to date ({len(hashes)} pages)")
+        return vectorstore
+    print(f"Web index {name} updated: {len(chunk_counts)} page(s) embedded, {len(stale_ids)} stale chunk(s) removed")
+    if vectorstore is not None:
+        save_index(vectorstore, manifest, index_path)
+    return vectorstore
+
+
+def create_web_vectorstore(name, urls, page_cache=None, **kwargs):
+    """Fetch `urls` through the page cache and return the up-to-date index `name`."""
+    page_cache = page_cache or WebPageCache()
+    return update_web_vectorstore(name, (page_cache.fetch(url) for url in urls), **kwargs)